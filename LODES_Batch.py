@@ -0,0 +1,160 @@
+###############################################
+# Title: LODES Batch
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Runs the LODES_Script_Tool.py flow analysis (steps 5 and 6) for many study areas
+# against one LODES file. The file is parsed and indexed once through LODES_Cache.py, then each
+# study area is handled by a worker process that memory maps the same cache entry, so the OD data
+# is shared through the OS page cache instead of being re-read per area. Also runs one study area
+# against many LODES files (years x states x main/aux) for trend tables. No arcpy.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import LODES_Core
+import LODES_Cache
+
+# LODES FILE NAMES, e.g. tx_od_main_JT00_2021.csv.gz, tx_od_aux_JT00_2021.csv.gz
+ODNAME = re.compile(r'^(?P<state>[a-z]{2})_od_(?P<part>main|aux)_(?P<jobType>JT\d\d)_(?P<year>\d{4})\.csv\.gz$', re.IGNORECASE)
+
+# WORKER STATE, filled once per worker process by loadWorker
+LOADED = {}
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO READ STUDY AREAS FROM A CSV OF NAME, GEOID PAIRS
+def readAreaCsv(path, nameField='name', geoidField='GEOID'):
+    """Reads a csv with one row per (study area, census block) and returns a dict of
+    study area name to list of block GEOIDs."""
+    areas = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            areas.setdefault(row[nameField], []).append(row[geoidField])
+    return areas
+
+# CREATE FUNCTION TO MAKE A STUDY AREA NAME SAFE FOR FOLDER AND TABLE NAMES
+def safeName(name):
+    """Replaces anything but letters, digits and underscores, geodatabase tables can't
+    start with a digit so those get a leading underscore."""
+    name = re.sub(r'\W', '_', str(name))
+    return '_' + name if name[:1].isdigit() or not name else name
+
+# CREATE FUNCTION TO OPEN THE CACHED LODES FILE IN A WORKER PROCESS
+def loadWorker(lodes, cacheDir, maxBytes):
+    """Process pool initializer, maps the cache entry once per worker."""
+    LOADED['columns'], LOADED['index'], LOADED['layout'] = LODES_Cache.openCache(lodes, cacheDir, maxBytes)
+
+# CREATE FUNCTION TO ANALYZE ONE STUDY AREA
+def analyzeArea(name, blockList, jobCols=None, outDir=None):
+    """Runs the extract, classify and sum steps for one study area against the loaded
+    LODES data. If outDir is given the stat tables are written to outDir/<name>/<table>.csv
+    as soon as they are built. Returns (name, statTables)."""
+    od = LODES_Core.filterIndexed(LOADED['columns'], LOADED['index'], blockList, LOADED['layout'], jobCols)
+    parts, statTables = LODES_Core.classifyOD(od, blockList, jobCols)
+    if outDir:
+        writeStatTables(statTables, os.path.join(outDir, safeName(name)))
+    return name, statTables
+
+# CREATE FUNCTION TO WRITE STAT TABLES AS CSV
+def writeStatTables(statTables, folder):
+    """Writes each stat table to folder/<table name>.csv."""
+    os.makedirs(folder, exist_ok=True)
+    for tableName, table in statTables.items():
+        table.to_csv(os.path.join(folder, tableName + '.csv'), index=False)
+
+# CREATE FUNCTION TO RUN MANY STUDY AREAS AGAINST ONE LODES FILE
+def runBatch(lodes, areas, outDir=None, jobCols=None, cacheDir=LODES_Cache.CACHEDIR,
+             maxBytes=LODES_Cache.MAXCACHEBYTES, workers=None):
+    """Analyzes every study area in areas (dict of name to block GEOID list) against
+    one LODES OD file. The cache entry is built (or found) once up front, then the
+    areas are spread across a process pool of workers processes (None uses one per
+    CPU, 1 runs in this process). Yields (name, statTables) as each area finishes, so
+    the caller can write or report results straight away."""
+    LODES_Cache.openCache(lodes, cacheDir, maxBytes) #parse and index before any worker starts
+
+    if workers == 1 or len(areas) <= 1:
+        loadWorker(lodes, cacheDir, maxBytes)
+        for name, blockList in areas.items():
+            yield analyzeArea(name, blockList, jobCols, outDir)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=loadWorker,
+                             initargs=(lodes, cacheDir, maxBytes)) as pool:
+        futures = [pool.submit(analyzeArea, name, list(blockList), jobCols, outDir)
+                   for name, blockList in areas.items()]
+        for future in as_completed(futures):
+            yield future.result()
+
+# CREATE FUNCTION TO READ STATE, PART, JOB TYPE AND YEAR FROM A LODES OD FILE NAME
+def parseLodesName(lodes):
+    """Returns a dict with state, part (main or aux), jobType and year (int) for a
+    LODES OD file named the way the Census Bureau publishes them."""
+    match = ODNAME.match(os.path.basename(lodes))
+    if not match:
+        raise ValueError("%s is not named like a LODES OD file (st_od_main_JT00_YYYY.csv.gz)" % lodes)
+    info = match.groupdict()
+    info['state'] = info['state'].lower()
+    info['part'] = info['part'].lower()
+    info['jobType'] = info['jobType'].upper()
+    info['year'] = int(info['year'])
+    return info
+
+# CREATE FUNCTION TO READ ONE LODES FILE FOR A TREND RUN
+def ingestFile(lodes, blockList, jobCols=None, cacheDir=LODES_Cache.CACHEDIR, maxBytes=LODES_Cache.MAXCACHEBYTES):
+    """Returns (lodes, rows touching the study area) for one file, through the cache
+    when cacheDir is set and straight from the csv.gz otherwise."""
+    if cacheDir:
+        return lodes, LODES_Cache.readLodesCached(lodes, blockList, jobCols, cacheDir, maxBytes)
+    return lodes, LODES_Core.readLodes(lodes, blockList, jobCols, 'od')
+
+# CREATE FUNCTION TO STACK STAT TABLES INTO ONE LONG TABLE
+def longStatTables(statTables, **keys):
+    """Returns one dataframe of all the stat tables, with a statTable, flow and geocode
+    column in place of the w_geo_txt/h_geo_txt key, and a column per keyword argument."""
+    frames = []
+    for tableName, table in statTables.items():
+        flow, key = LODES_Core.FLOWSUMS[tableName]
+        table = table.rename(columns={LODES_Core.KEYFIELDS[key]: 'geocode'})
+        table.insert(0, 'statTable', tableName)
+        table.insert(1, 'flow', flow)
+        for i, (name, value) in enumerate(keys.items()):
+            table.insert(i, name, value)
+        frames.append(table)
+    return pd.concat(frames, ignore_index=True)
+
+# CREATE FUNCTION TO RUN ONE STUDY AREA AGAINST MANY LODES FILES
+def runTrend(files, blockList, jobCols=None, cacheDir=LODES_Cache.CACHEDIR,
+             maxBytes=LODES_Cache.MAXCACHEBYTES, workers=None):
+    """Reads and filters every LODES OD file in files concurrently (one process per
+    file, up to workers), then classifies and sums each year. Files from the same year
+    and job type (main and aux, and neighbouring states) are stacked before summing,
+    they never share a row so nothing is double counted. Returns one long dataframe
+    keyed by year, jobType, statTable/flow and geocode."""
+    if not files:
+        raise ValueError("No LODES files given")
+    info = {lodes: parseLodesName(lodes) for lodes in files}
+
+    if workers == 1 or len(files) <= 1:
+        ingested = [ingestFile(lodes, blockList, jobCols, cacheDir, maxBytes) for lodes in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ingestFile, lodes, list(blockList), jobCols, cacheDir, maxBytes) for lodes in files]
+            ingested = [future.result() for future in as_completed(futures)]
+
+    groups = {}
+    for lodes, od in ingested:
+        groups.setdefault((info[lodes]['year'], info[lodes]['jobType']), []).append(od)
+
+    frames = []
+    for (year, jobType), ods in sorted(groups.items()):
+        od = pd.concat(ods, ignore_index=True)
+        parts, statTables = LODES_Core.classifyOD(od, blockList, jobCols)
+        frames.append(longStatTables(statTables, year=year, jobType=jobType))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,117 @@
+###############################################
+# Title: LODES Batch Analysis
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Script tool that runs the LODES flow analysis for many study areas at once (city limits,
+# ETJs, districts...) against one LODES OD file. The LODES file is parsed and indexed once, and the
+# study areas are split across a process pool (see LODES_Batch.py).
+# Pseudocode:
+# 1 set input parameters
+# 2 Build a block GEOID list per study area, from a polygon layer (one spatial join) or a name,GEOID csv
+# 3 Run every study area against the LODES file in parallel
+# 4 Write each study area's stat tables to the default geodatabase as it finishes
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import arcpy
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #LODES_*.py live next to this script
+import LODES_Core
+import LODES_Batch
+from LODES_ToolUtils import AddMsgAndPrint, getOptionalParameter, getJobCols, useEnvironmentPython
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+#CREATE FUNCTION TO GET BLOCK GEOIDS FOR EVERY POLYGON IN A LAYER
+def areasFromLayer(areaLayer, nameField, cenBlocks):
+    """One spatial join of census blocks to all study area polygons, instead of a
+    select by location per polygon. Returns a dict of study area name to GEOID list.
+    The join only carries the block GEOID, and names are looked up by JOIN_FID, so a
+    block field with the same name as nameField can't be read in its place."""
+    names = {}
+    with arcpy.da.SearchCursor(areaLayer, ['OID@', nameField]) as cur:
+        for oid, name in cur:
+            names[oid] = str(name)
+
+    fieldMap = arcpy.FieldMap()
+    fieldMap.addInputField(cenBlocks, 'GEOID')
+    fieldMappings = arcpy.FieldMappings()
+    fieldMappings.addFieldMap(fieldMap)
+    joined = arcpy.analysis.SpatialJoin(cenBlocks, areaLayer, r'memory\areaBlocks', 'JOIN_ONE_TO_MANY',
+                                        'KEEP_COMMON', fieldMappings, match_option='INTERSECT')
+    areas = {}
+    with arcpy.da.SearchCursor(joined, ['GEOID', 'JOIN_FID']) as cur:
+        for geoid, areaId in cur:
+            areas.setdefault(names[areaId], []).append(geoid)
+    arcpy.management.Delete(joined)
+    return areas
+
+
+
+##---------------------------------------------------------------------------------------------------
+def main():
+    ## 1 INPUT PARAMETERS
+    aprx = arcpy.mp.ArcGISProject("CURRENT")
+    arcpy.env.overwriteOutput = True
+    defaultGDB = aprx.defaultGeodatabase
+
+    inAreas = arcpy.GetParameterAsText(0) #study area polygon layer, or csv of name,GEOID rows
+    nameField = arcpy.GetParameterAsText(1) #field holding each study area's name (polygon layer only)
+    cenBlocks = arcpy.GetParameterAsText(2) #census blocks layer with a GEOID field (polygon layer only)
+    lodes = arcpy.GetParameterAsText(3) #LODES OD csv.gz
+    outFolder = arcpy.GetParameterAsText(4) #stat table csvs are written to outFolder\<study area>
+    try:
+        jobCols = getJobCols(5) #checked here, a typo would otherwise only fail inside a worker process
+    except ValueError as e:
+        AddMsgAndPrint(str(e), 2)
+        sys.exit()
+    cacheDir = getOptionalParameter(6, os.path.join(aprx.homeFolder, 'LODES_Cache'))
+    workers = int(getOptionalParameter(7, 0)) or None #0 or empty uses one worker per CPU
+
+    #a polygon layer needs its name field and a census block layer, check them before any work is done
+    fromCsv = inAreas.lower().endswith('.csv')
+    if not fromCsv:
+        if arcpy.Describe(inAreas).shapeType != "Polygon":
+            AddMsgAndPrint("Input Study Areas must be of type polygon.", 2)
+            sys.exit()
+        if not nameField or not arcpy.ListFields(inAreas, nameField):
+            AddMsgAndPrint("Study area name field must be a field of the study area layer.", 2)
+            sys.exit()
+        if not cenBlocks or not arcpy.ListFields(cenBlocks, 'GEOID'):
+            AddMsgAndPrint("Census blocks with a GEOID field are needed for a polygon study area layer.", 2)
+            sys.exit()
+
+    ## 2 BLOCK LIST PER STUDY AREA
+    arcpy.SetProgressor("", "Finding census blocks for each study area")
+    if fromCsv:
+        areas = LODES_Batch.readAreaCsv(inAreas)
+    else:
+        areas = areasFromLayer(inAreas, nameField, cenBlocks)
+    AddMsgAndPrint("%d study areas, %d blocks" % (len(areas), sum(len(b) for b in areas.values())))
+
+    ## 3 RUN EVERY STUDY AREA
+    useEnvironmentPython()
+
+    arcpy.SetProgressor("step", "Analyzing study areas", 0, len(areas), 1)
+    results = LODES_Batch.runBatch(lodes, areas, outFolder, jobCols, cacheDir, workers=workers)
+
+    ## 4 WRITE EACH STUDY AREA AS IT FINISHES
+    for name, statTables in results:
+        for tableName, table in statTables.items():
+            outTable = os.path.join(defaultGDB, LODES_Batch.safeName(name) + '_' + tableName)
+            if arcpy.Exists(outTable):
+                arcpy.management.Delete(outTable)
+            arcpy.da.NumPyArrayToTable(LODES_Core.statTableToArray(table), outTable)
+        AddMsgAndPrint("Finished " + name)
+        arcpy.SetProgressorPosition()
+
+    arcpy.AddMessage('end')
+
+
+#worker processes import this file too, only run the tool in the main process
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+###############################################
+# Title: LODES Benchmark
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Benchmarks the LODES read/filter/sum core (LODES_Core.py, LODES_Cache.py) outside of ArcGIS Pro.
+# Generates synthetic LODES OD csv.gz files with GEOID like keys and skewed flows, picks study areas of a few
+# sizes, and runs each engine against them, reporting throughput and peak memory. Every case runs in its own
+# fresh process so peak memory is that case's alone.
+# Engines:
+#   scan     LODES_Core.readLodes, streams the csv.gz
+#   columns  LODES_Core.filterColumns over the cache's memory mapped columns, a chunked scan
+#   indexed  LODES_Core.filterIndexed over the cache's sorted geocode index (what the script tool uses)
+# Modes: csv (no cache), cold (cache entry built first, build time included), warm (cache entry already built)
+# Usage:
+#   python LODES_Benchmark.py --rows 1000000 10000000 50000000 --blocks 10000 100000 300000 --out bench
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import LODES_Core
+import LODES_Cache
+import LODES_Profile
+
+# SYNTHETIC DATA SETTINGS
+STATEFIPS = 48 #keys look like Texas blocks
+COUNTIES = 254
+BLOCKSPERTRACT = 100 #about what a tract has in the 2020 blocks
+UNIVERSEBLOCKS = 600000 #blocks in the synthetic state, real states run from tens of thousands to about 700,000
+ZIPFEXPONENT = 1.1 #how concentrated work locations are, higher puts more jobs in fewer blocks
+SAMECOUNTY = 0.6 #share of workers living in the county they work in
+WRITECHUNK = 1000000 #rows generated and written at a time
+
+# BENCHMARK CASES, (engine, mode) in the order they run, cold comes before warm so warm finds the entry built
+CASES = [('scan', 'csv'), ('indexed', 'cold'), ('indexed', 'warm'), ('columns', 'warm')]
+DEFAULTROWS = [1000000, 10000000, 50000000]
+DEFAULTBLOCKS = [10000, 100000, 300000]
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO BUILD A SYNTHETIC STATE OF CENSUS BLOCKS
+def blockUniverse(nBlocks=UNIVERSEBLOCKS, seed=0):
+    """Returns (geoids, county), sorted int64 GEOIDs laid out state (2) + county (3)
+    + tract (6) + block (4), and the county number of each. Big counties get many
+    more tracts than small ones, like the real thing."""
+    rng = np.random.default_rng(seed)
+    tracts = max(1, nBlocks // BLOCKSPERTRACT)
+    countyWeights = 1.0 / np.arange(1, COUNTIES + 1) ** ZIPFEXPONENT
+    tractCounty = np.sort(rng.choice(COUNTIES, tracts, p=countyWeights / countyWeights.sum()))
+    tractCode = (np.arange(tracts) - np.searchsorted(tractCounty, tractCounty) + 1) * 100 #000100, 000200... within each county
+
+    blockTract = np.sort(rng.integers(0, tracts, nBlocks))
+    blockCode = 1000 + np.arange(nBlocks) - np.searchsorted(blockTract, blockTract)
+    county = tractCounty[blockTract]
+    geoids = (STATEFIPS * 10 ** 13 + (2 * county + 1) * 10 ** 10 #county FIPS codes are odd
+              + tractCode[blockTract] * 10 ** 4 + blockCode)
+    return geoids.astype('int64'), county
+
+# CREATE FUNCTION TO GENERATE ONE CHUNK OF OD ROWS
+def odChunk(rng, geoids, county, workWeights, rows):
+    """Returns a dataframe of rows synthetic OD rows in the LODES layout. Work blocks
+    follow a Zipf-like distribution, SAMECOUNTY of workers live in the same county as
+    their work block and the rest anywhere, job counts are mostly 1 with a long tail."""
+    work = rng.choice(len(geoids), rows, p=workWeights)
+    countyStart = np.searchsorted(county, county[work], 'left')
+    countyStop = np.searchsorted(county, county[work], 'right')
+    local = countyStart + (rng.random(rows) * (countyStop - countyStart)).astype('int64')
+    anywhere = rng.integers(0, len(geoids), rows)
+    home = np.where(rng.random(rows) < SAMECOUNTY, local, anywhere)
+
+    frame = pd.DataFrame({'w_geocode': geoids[work], 'h_geocode': geoids[home]})
+    total = rng.geometric(0.6, rows)
+    frame['S000'] = total
+    for prefix in ('SA', 'SE', 'SI'): #each segment group splits the same total three ways
+        split = rng.multinomial(total, [0.3, 0.5, 0.2])
+        for i in range(3):
+            frame['%s0%d' % (prefix, i + 1)] = split[:, i]
+    frame['createdate'] = 20230901
+    return frame
+
+# CREATE FUNCTION TO WRITE A SYNTHETIC OD FILE
+def writeSyntheticOD(path, rows, geoids, county, seed=0):
+    """Writes a LODES OD csv.gz with rows rows, WRITECHUNK at a time so a 50M row
+    file never sits in memory. Skipped if the file already exists."""
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    workWeights = 1.0 / rng.permutation(np.arange(1, len(geoids) + 1)) ** ZIPFEXPONENT
+    workWeights /= workWeights.sum()
+
+    partial = path + '.partial'
+    with gzip.open(partial, 'wt', compresslevel=1, newline='') as f:
+        for start in range(0, rows, WRITECHUNK):
+            chunk = odChunk(rng, geoids, county, workWeights, min(WRITECHUNK, rows - start))
+            chunk.to_csv(f, header=start == 0, index=False)
+    os.replace(partial, path)
+    return path
+
+# CREATE FUNCTION TO PICK A STUDY AREA
+def studyArea(geoids, nBlocks, seed=0):
+    """Returns nBlocks GEOIDs in a run of neighbouring tracts, the way a city or
+    district covers whole neighbourhoods rather than blocks scattered statewide."""
+    rng = np.random.default_rng(seed)
+    nBlocks = min(nBlocks, len(geoids))
+    start = rng.integers(0, len(geoids) - nBlocks + 1)
+    return geoids[start:start + nBlocks]
+
+# CREATE FUNCTION TO RUN ONE BENCHMARK CASE, called in a fresh worker process
+def runCase(lodes, blockList, engine, mode, cacheDir, jobCols=None):
+    """Runs one engine/mode against a file and study area and returns its timings,
+    row counts and peak memory. Filtering and classifyOD are timed separately."""
+    result = {'engine': engine, 'mode': mode, 'baseRssMB': LODES_Profile.peakRssMB()}
+    start = time.perf_counter()
+    if engine == 'scan':
+        od = LODES_Core.readLodes(lodes, blockList, jobCols, 'od')
+    else:
+        columns, index, layout = LODES_Cache.openCache(lodes, cacheDir, maxBytes=float('inf'))
+        if engine == 'indexed':
+            od = LODES_Core.filterIndexed(columns, index, blockList, layout, jobCols)
+        else:
+            od = LODES_Core.filterColumns(columns, blockList, layout, jobCols)
+    result['filterSeconds'] = time.perf_counter() - start
+    result['rowsOut'] = len(od)
+
+    start = time.perf_counter()
+    parts, statTables = LODES_Core.classifyOD(od, blockList)
+    result['classifySeconds'] = time.perf_counter() - start
+    result['statRows'] = sum(len(table) for table in statTables.values())
+    result['peakRssMB'] = LODES_Profile.peakRssMB()
+    return result
+
+# CREATE FUNCTION TO RUN EVERY CASE FOR ONE FILE AND STUDY AREA
+def benchmarkFile(lodes, rows, blockSets, cacheDir, cases=CASES, jobCols=None):
+    """Runs every case against every study area for one LODES file. The cache entry is
+    removed first so the first cold case really builds it. Yields one result dict per case."""
+    context = multiprocessing.get_context('spawn') #a clean process per case, peak memory starts from zero
+    for nBlocks, blockList in blockSets.items():
+        for engine, mode in cases:
+            if mode == 'cold':
+                shutil.rmtree(cacheDir, ignore_errors=True)
+                os.makedirs(cacheDir)
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(runCase, lodes, blockList, engine, mode, cacheDir, jobCols).result()
+            result.update({'rows': rows, 'studyBlocks': nBlocks,
+                           'rowsPerSecond': rows / result['filterSeconds'] if result['filterSeconds'] else None})
+            yield result
+
+# CREATE FUNCTION TO RUN THE WHOLE SUITE
+def runSuite(outDir, rowCounts=DEFAULTROWS, blockCounts=DEFAULTBLOCKS, universe=UNIVERSEBLOCKS,
+             cases=CASES, jobCols=None, seed=0, message=print):
+    """Generates (or reuses) a synthetic OD file per row count in outDir, runs every case
+    against study areas of each block count and returns the results as a dataframe,
+    also written to outDir as benchmark.csv and benchmark.json."""
+    os.makedirs(outDir, exist_ok=True)
+    geoids, county = blockUniverse(universe, seed)
+    blockSets = {n: studyArea(geoids, n, seed) for n in blockCounts}
+    cacheDir = os.path.join(outDir, 'cache')
+
+    results = []
+    for rows in rowCounts:
+        lodes = os.path.join(outDir, 'synthetic_od_%d_%d.csv.gz' % (rows, seed))
+        message("Generating %s" % lodes)
+        writeSyntheticOD(lodes, rows, geoids, county, seed)
+        for result in benchmarkFile(lodes, rows, blockSets, cacheDir, cases, jobCols):
+            message("%(rows)d rows, %(studyBlocks)d blocks, %(engine)s/%(mode)s: filter %(filterSeconds).2fs, "
+                    "classify %(classifySeconds).2fs, peak %(peakRssMB).0f MB" % result)
+            results.append(result)
+
+    columns = ['rows', 'studyBlocks', 'engine', 'mode', 'rowsOut', 'statRows', 'filterSeconds',
+               'classifySeconds', 'rowsPerSecond', 'baseRssMB', 'peakRssMB']
+    table = pd.DataFrame(results, columns=columns)
+    table.to_csv(os.path.join(outDir, 'benchmark.csv'), index=False)
+    with open(os.path.join(outDir, 'benchmark.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    return table
+
+
+
+##---------------------------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LODES read/filter/sum core on synthetic OD files.")
+    parser.add_argument('--out', default='LODES_Benchmark_Output', help="folder for synthetic files, cache and results")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULTROWS, help="OD rows per synthetic file")
+    parser.add_argument('--blocks', type=int, nargs='+', default=DEFAULTBLOCKS, help="census blocks per study area")
+    parser.add_argument('--universe', type=int, default=UNIVERSEBLOCKS, help="census blocks in the synthetic state")
+    parser.add_argument('--engines', nargs='+', default=sorted(set(engine for engine, mode in CASES)),
+                        help="engines to run: scan, columns, indexed")
+    parser.add_argument('--jobcols', nargs='+', default=None, help="job columns to read, default all")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cases = [(engine, mode) for engine, mode in CASES if engine in args.engines]
+    if 'columns' in args.engines and 'indexed' not in args.engines:
+        cases.insert(0, ('columns', 'cold')) #warm needs a cold run first to build the entry
+    table = runSuite(args.out, args.rows, args.blocks, args.universe, cases, args.jobcols, args.seed)
+    print(table.to_string(index=False))
+
+
+#worker processes import this file too, only run the suite in the main process
+if __name__ == '__main__':
+    main()
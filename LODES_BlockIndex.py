@@ -0,0 +1,164 @@
+###############################################
+# Title: LODES Block Index
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Reads the census block table that LODES_Blocks.py writes next to the local block store:
+# one row per block with its GEOID, ObjectID in the store feature class, centroid and bounding box,
+# sorted by GEOID. Lookups by GEOID or by bounding box need only numpy, no arcpy.
+# Also builds a packed R-tree (Sort-Tile-Recursive) over the block bounding boxes, saved as a .npz
+# beside the table, so "which blocks could touch this polygon" is answered without a full pass.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import numpy as np
+
+# BLOCK TABLE LAYOUT
+BLOCKDTYPE = [('geoid', '<i8'), ('oid', '<i8'), ('x', '<f8'), ('y', '<f8'),
+              ('xmin', '<f8'), ('ymin', '<f8'), ('xmax', '<f8'), ('ymax', '<f8')]
+
+# TREE SETTINGS
+NODESIZE = 32 #children per tree node, and blocks per leaf
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO SAVE THE BLOCK TABLE
+def saveBlockTable(table, path):
+    """Sorts a BLOCKDTYPE array by GEOID and saves it as a .npy file."""
+    table = np.sort(np.asarray(table, dtype=BLOCKDTYPE), order='geoid')
+    np.save(path, table)
+
+# CREATE FUNCTION TO OPEN THE BLOCK TABLE
+def loadBlockTable(path):
+    """Memory maps a block table saved by saveBlockTable, read only."""
+    return np.load(path, mmap_mode='r')
+
+# CREATE FUNCTION TO FIND THE ROW OF EACH GEOID IN THE BLOCK TABLE
+def lookupRows(table, geoids):
+    """Returns the block table row number of each GEOID (ints or strings), -1 where
+    the GEOID is not in the table. One binary search per GEOID."""
+    geoids = np.asarray(geoids if isinstance(geoids, np.ndarray) else list(geoids), dtype='int64')
+    if len(table) == 0:
+        return np.full(len(geoids), -1, dtype='int64')
+    pos = np.searchsorted(table['geoid'], geoids)
+    pos[pos == len(table)] = 0
+    return np.where(table['geoid'][pos] == geoids, pos, -1)
+
+# CREATE FUNCTION TO LOOK BLOCKS UP BY GEOID
+def blockRecords(table, geoids):
+    """Returns the rows of the block table for the given GEOIDs (ints or strings),
+    in the order given, skipping any GEOID that is not in the table."""
+    rows = lookupRows(table, geoids)
+    return table[rows[rows >= 0]]
+
+# CREATE FUNCTION TO MATCH A STAT TABLE TO BLOCK OBJECTIDS
+def joinStatTable(table, statTable, keyField):
+    """Attaches block ObjectIDs to a stat table by GEOID lookup. Returns (oids,
+    matched), the ObjectID of every stat table row that has a block and those stat
+    table rows in the same order. Rows with no block are dropped, like KEEP_COMMON."""
+    rows = lookupRows(table, statTable[keyField].to_numpy())
+    found = rows >= 0
+    return np.asarray(table['oid'][rows[found]]), statTable[found]
+
+# CREATE FUNCTION TO FIND BLOCKS WHOSE BOUNDING BOX TOUCHES AN EXTENT
+def blocksInExtent(table, xmin, ymin, xmax, ymax):
+    """Returns the rows of the block table whose bounding box overlaps the extent.
+    One vectorized pass over every block."""
+    hit = ((table['xmin'] <= xmax) & (table['xmax'] >= xmin)
+           & (table['ymin'] <= ymax) & (table['ymax'] >= ymin))
+    return table[hit]
+
+# CREATE FUNCTION TO BUILD A PACKED R-TREE OVER THE BLOCK TABLE
+def buildBlockTree(table, nodeSize=NODESIZE):
+    """Sort-Tile-Recursive packing of the block bounding boxes. Returns a dict with
+    order (block table rows in leaf order) and levels, a list of (xmin, ymin, xmax,
+    ymax) node box arrays from the leaves up. Node i of a level covers entries
+    i*nodeSize to (i+1)*nodeSize-1 of the level below (or of order, for leaves)."""
+    n = len(table)
+    x = np.asarray(table['x'])
+    y = np.asarray(table['y'])
+
+    # sort into vertical slices by centroid x, then by centroid y inside each slice
+    leaves = max(1, -(-n // nodeSize))
+    slices = int(np.ceil(np.sqrt(leaves)))
+    perSlice = slices * nodeSize
+    byX = np.argsort(x, kind='stable')
+    column = np.empty(n, dtype='int64')
+    column[byX] = np.arange(n) // perSlice
+    order = np.lexsort((y, column))
+
+    boxes = tuple(np.asarray(table[col])[order] for col in ('xmin', 'ymin', 'xmax', 'ymax'))
+    levels = []
+    while True:
+        boxes = packLevel(boxes, nodeSize)
+        levels.append(boxes)
+        if len(boxes[0]) <= 1:
+            break
+    return {'order': order, 'levels': levels, 'nodeSize': nodeSize}
+
+# CREATE FUNCTION TO GROUP ONE TREE LEVEL INTO PARENT NODES
+def packLevel(boxes, nodeSize):
+    """Returns the parent boxes of every run of nodeSize boxes."""
+    starts = np.arange(0, len(boxes[0]), nodeSize)
+    return (np.minimum.reduceat(boxes[0], starts), np.minimum.reduceat(boxes[1], starts),
+            np.maximum.reduceat(boxes[2], starts), np.maximum.reduceat(boxes[3], starts))
+
+# CREATE FUNCTION TO SAVE A BLOCK TREE
+def saveBlockTree(tree, path):
+    """Saves a tree from buildBlockTree as a .npz file."""
+    arrays = {'order': tree['order'], 'nodeSize': np.array(tree['nodeSize'])}
+    for i, boxes in enumerate(tree['levels']):
+        for name, values in zip(('xmin', 'ymin', 'xmax', 'ymax'), boxes):
+            arrays['%s%d' % (name, i)] = values
+    np.savez(path, **arrays)
+
+# CREATE FUNCTION TO LOAD A BLOCK TREE
+def loadBlockTree(path):
+    """Loads a tree saved by saveBlockTree."""
+    with np.load(path) as arrays:
+        levels = []
+        while 'xmin%d' % len(levels) in arrays:
+            i = len(levels)
+            levels.append(tuple(arrays['%s%d' % (name, i)] for name in ('xmin', 'ymin', 'xmax', 'ymax')))
+        return {'order': arrays['order'], 'levels': levels, 'nodeSize': int(arrays['nodeSize'])}
+
+# CREATE FUNCTION TO FIND BLOCKS WHOSE BOUNDING BOX TOUCHES AN EXTENT, THROUGH THE TREE
+def queryBlockTree(tree, table, xmin, ymin, xmax, ymax):
+    """Returns the block table row numbers whose bounding box overlaps the extent,
+    walking down the tree one level at a time and only expanding nodes that overlap.
+    Same blocks as blocksInExtent, without touching every block."""
+    nodeSize = tree['nodeSize']
+
+    def overlaps(boxes, idx):
+        return idx[(boxes[0][idx] <= xmax) & (boxes[2][idx] >= xmin)
+                   & (boxes[1][idx] <= ymax) & (boxes[3][idx] >= ymin)]
+
+    def children(idx, count):
+        kids = (idx[:, None] * nodeSize + np.arange(nodeSize)).ravel()
+        return kids[kids < count]
+
+    levels = tree['levels']
+    nodes = overlaps(levels[-1], np.arange(len(levels[-1][0])))
+    for level in range(len(levels) - 2, -1, -1):
+        nodes = overlaps(levels[level], children(nodes, len(levels[level][0])))
+
+    entries = children(nodes, len(tree['order']))
+    rows = tree['order'][entries]
+    hit = ((table['xmin'][rows] <= xmax) & (table['xmax'][rows] >= xmin)
+           & (table['ymin'][rows] <= ymax) & (table['ymax'][rows] >= ymin))
+    return np.sort(rows[hit])
+
+# CREATE FUNCTION TO SPLIT IDS INTO CLOSE TOGETHER RANGES
+def idRanges(ids, maxGap=1000):
+    """Returns a list of (first, last) ranges covering the sorted unique ids, starting a
+    new range wherever two ids are more than maxGap apart. Used to read candidate
+    blocks with a few ObjectID range queries instead of one huge IN list."""
+    ids = np.unique(np.asarray(ids, dtype='int64'))
+    if len(ids) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(ids) > maxGap)
+    firsts = np.r_[ids[0], ids[breaks + 1]]
+    lasts = np.r_[ids[breaks], ids[-1]]
+    return list(zip(firsts.tolist(), lasts.tolist()))
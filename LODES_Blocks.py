@@ -0,0 +1,425 @@
+###############################################
+# Title: LODES Blocks
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Local census block store for LODES_Script_Tool.py, built once from Census TIGER/Line
+# tabblock files (e.g. tl_2020_48_tabblock20.shp) so the tool doesn't pull blocks from the Living Atlas
+# FeatureServer on every run. The store is a folder holding:
+#   LODES_Blocks.gdb\censusBlocks   block polygons, GEOID text field with a unique attribute index
+#   censusBlocks.npy                GEOID, ObjectID, centroid and extent of every block (see LODES_BlockIndex.py)
+#   censusBlocks_tree.npz           packed R-tree over the block extents (see LODES_BlockIndex.py)
+# Without a store the GEOID/ObjectID table of the block layer is saved once in the LODES cache folder as an entry
+# of its own (blocks_<layer hash>\blocks.npy and meta.json, counted and evicted by LODES_Cache.trimCache like a
+# LODES entry), and read again when the layer's feature count or last edit date changes or its ObjectIDs moved.
+# Outputs carry the census block attribute fields next to GEOID and the stat table fields, like AddJoin and
+# CopyFeatures gave them.
+# Run as a script tool to build a store (LODES_Build_Block_Store in LODES_Script_Tool.atbx): parameter 0 TIGER block
+# shapefiles (multivalue), parameter 1 store folder.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import arcpy
+import hashlib
+import json
+import multiprocessing
+import sys
+import os
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #LODES_*.py live next to this script
+import numpy as np
+import LODES_Core
+import LODES_Cache
+import LODES_BlockIndex
+
+# STORE NAMES
+STOREGDB = 'LODES_Blocks.gdb'
+BLOCKFC = 'censusBlocks'
+BLOCKTABLE = 'censusBlocks.npy'
+BLOCKTREE = 'censusBlocks_tree.npz'
+GEOIDFIELDS = ['GEOID', 'GEOID20', 'GEOID10'] #TIGER names the block GEOID after the census year
+DELETECHUNK = 500 #GEOIDs per IN (...) query when deleting output features
+LAYERPREFIX = 'blocks_' #cache folder entries holding the block tables of layers with no store
+LAYERDTYPE = [('geoid', '<i8'), ('oid', '<i8')] #only GEOID and ObjectID, a layer with no store has no centroids or extents
+LAYERSAMPLE = 16 #ObjectIDs checked against the layer before a saved table is used again
+
+# FIELD TYPES, ListFields type to AddFields type, for copying the block attributes to the outputs
+FIELDTYPES = {'String': 'TEXT', 'Integer': 'LONG', 'SmallInteger': 'SHORT', 'BigInteger': 'BIGINTEGER',
+              'Double': 'DOUBLE', 'Single': 'FLOAT', 'Date': 'DATE', 'DateOnly': 'DATEONLY',
+              'TimeOnly': 'TIMEONLY', 'TimestampOffset': 'TIMESTAMPOFFSET', 'Guid': 'GUID'}
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO GET THE STORE FEATURE CLASS PATH
+def storeFeatureClass(storeFolder):
+    """Returns the path of the block feature class in a store folder."""
+    fc = os.path.join(storeFolder, STOREGDB, BLOCKFC)
+    if not arcpy.Exists(fc):
+        raise ValueError("No census block store in %s, build one with LODES_Blocks.buildBlockStore" % storeFolder)
+    return fc
+
+# CREATE FUNCTION TO GET THE STORE BLOCK TABLE
+def storeBlockTable(storeFolder):
+    """Returns the memory mapped GEOID/centroid/extent table of a store folder."""
+    return LODES_BlockIndex.loadBlockTable(os.path.join(storeFolder, BLOCKTABLE))
+
+# CREATE FUNCTION TO GET THE STORE BLOCK TREE
+def storeBlockTree(storeFolder):
+    """Returns the R-tree of a store folder, building and saving it the first time."""
+    treePath = os.path.join(storeFolder, BLOCKTREE)
+    if not os.path.exists(treePath):
+        LODES_BlockIndex.saveBlockTree(LODES_BlockIndex.buildBlockTree(storeBlockTable(storeFolder)), treePath)
+    return LODES_BlockIndex.loadBlockTree(treePath)
+
+# CREATE FUNCTION TO BUILD A LOCAL BLOCK STORE FROM TIGER FILES
+def buildBlockStore(tigerFiles, storeFolder):
+    """Merges TIGER/Line tabblock shapefiles into the store feature class, renames the
+    year specific GEOID field to GEOID, indexes it, and writes the block table."""
+    os.makedirs(storeFolder, exist_ok=True)
+    gdb = os.path.join(storeFolder, STOREGDB)
+    if not arcpy.Exists(gdb):
+        arcpy.management.CreateFileGDB(storeFolder, STOREGDB)
+    fc = os.path.join(gdb, BLOCKFC)
+    if arcpy.Exists(fc):
+        arcpy.management.Delete(fc)
+    arcpy.management.Merge(tigerFiles, fc)
+
+    fieldNames = [f.name for f in arcpy.ListFields(fc)]
+    geoidField = next((f for f in GEOIDFIELDS if f in fieldNames), None)
+    if geoidField is None:
+        raise ValueError("No GEOID field (%s) in the TIGER files" % ', '.join(GEOIDFIELDS))
+    if geoidField != 'GEOID':
+        arcpy.management.AlterField(fc, geoidField, 'GEOID', 'GEOID')
+    arcpy.management.AddIndex(fc, 'GEOID', 'GEOID_idx', 'UNIQUE')
+    arcpy.management.AddSpatialIndex(fc)
+
+    writeBlockTable(fc, os.path.join(storeFolder, BLOCKTABLE))
+    treePath = os.path.join(storeFolder, BLOCKTREE)
+    if os.path.exists(treePath):
+        os.remove(treePath)
+    storeBlockTree(storeFolder)
+    return fc
+
+# CREATE FUNCTION TO WRITE THE BLOCK TABLE FROM A BLOCK FEATURE CLASS
+def writeBlockTable(fc, path):
+    """One cursor pass over the blocks, saving GEOID, ObjectID, centroid and extent."""
+    rows = []
+    with arcpy.da.SearchCursor(fc, ['GEOID', 'OID@', 'SHAPE@TRUECENTROID', 'SHAPE@EXTENT']) as cur:
+        for geoid, oid, (x, y), extent in cur:
+            rows.append((int(geoid), oid, x, y, extent.XMin, extent.YMin, extent.XMax, extent.YMax))
+    LODES_BlockIndex.saveBlockTable(np.array(rows, dtype=LODES_BlockIndex.BLOCKDTYPE), path)
+
+# CREATE FUNCTION TO GET A STUDY AREA AS ONE POLYGON
+def studyAreaPolygon(inArea):
+    """Unions every feature of the study area layer into one polygon geometry."""
+    polygon = None
+    with arcpy.da.SearchCursor(inArea, 'SHAPE@') as cur:
+        for (shape,) in cur:
+            polygon = shape if polygon is None else polygon.union(shape)
+    return polygon
+
+# CREATE FUNCTION TO FIND THE BLOCKS INTERSECTING A POLYGON
+def blocksIntersecting(storeFolder, polygon):
+    """Returns the block table rows (GEOID, ObjectID, centroid, extent) of every block
+    in the store that intersects polygon. The R-tree narrows the blocks down to the
+    ones whose extent overlaps the polygon's, then only those geometries are read, a
+    few ObjectID ranges at a time, and tested exactly."""
+    fc = storeFeatureClass(storeFolder)
+    table = storeBlockTable(storeFolder)
+    desc = arcpy.Describe(fc)
+    polygon = polygon.projectAs(desc.spatialReference)
+
+    extent = polygon.extent
+    candidates = table[LODES_BlockIndex.queryBlockTree(storeBlockTree(storeFolder), table,
+                                                       extent.XMin, extent.YMin, extent.XMax, extent.YMax)]
+    candidateOids = set(candidates['oid'].tolist())
+
+    # blocks next to each other are close together in a TIGER file, so their ObjectIDs come in a few runs
+    oidField = arcpy.AddFieldDelimiters(fc, desc.OIDFieldName)
+    inside = []
+    for first, last in LODES_BlockIndex.idRanges(candidates['oid']):
+        where = "%s >= %d AND %s <= %d" % (oidField, first, oidField, last)
+        with arcpy.da.SearchCursor(fc, ['OID@', 'SHAPE@'], where) as cur:
+            for oid, shape in cur:
+                if oid in candidateOids and not polygon.disjoint(shape):
+                    inside.append(oid)
+    return candidates[np.isin(candidates['oid'], inside)]
+
+# CREATE FUNCTION TO GET THE LAST EDIT DATE OF A FEATURE SERVICE LAYER
+def serviceEditDate(source):
+    """Returns the lastEditDate a feature service layer reports at its REST endpoint,
+    None for any other source or if the service doesn't say (or can't be reached)."""
+    if not source.lower().startswith('http'):
+        return None
+    try:
+        with urllib.request.urlopen(source + '?f=json', timeout=30) as response:
+            return json.load(response).get('editingInfo', {}).get('lastEditDate')
+    except Exception:
+        return None
+
+# CREATE FUNCTION TO CHECK A SAVED BLOCK TABLE AGAINST ITS LAYER
+def sampleMatches(blocks, table, sample=LAYERSAMPLE):
+    """Reads sample ObjectIDs spread over a saved (geoid, oid) table back from the layer
+    and returns True if every one still has the same GEOID. A republished service with
+    the same number of blocks renumbers its ObjectIDs and fails this."""
+    if len(table) == 0:
+        return True
+    picked = table[np.linspace(0, len(table) - 1, min(sample, len(table))).astype('int64')]
+    oidField = arcpy.AddFieldDelimiters(blocks, arcpy.Describe(blocks).OIDFieldName)
+    where = "%s IN (%s)" % (oidField, ', '.join(str(oid) for oid in picked['oid'].tolist()))
+    with arcpy.da.SearchCursor(blocks, ['OID@', 'GEOID'], where) as cur:
+        found = {oid: int(geoid) for oid, geoid in cur}
+    return all(found.get(oid) == geoid for geoid, oid in picked.tolist())
+
+# CREATE FUNCTION TO BUILD A GEOID TO OBJECTID TABLE FROM ANY BLOCK LAYER
+def layerBlockTable(blocks, cacheDir=None):
+    """Returns a (geoid, oid) table (LAYERDTYPE) sorted by GEOID for a block layer with
+    no store (e.g. the Living Atlas layer), from one cursor pass over GEOID and ObjectID,
+    no geometry. It stands in for the store block table wherever only GEOID lookups are
+    needed. With cacheDir the table is kept there as a cache entry, so it counts toward
+    the cache size cap, and reused while the layer has the same feature count and last
+    edit date and a sample of its ObjectIDs still match (see sampleMatches)."""
+    entryDir = None
+    if cacheDir:
+        source = arcpy.Describe(blocks).catalogPath
+        entryDir = os.path.join(cacheDir, LAYERPREFIX + hashlib.sha1(source.encode('utf-8')).hexdigest())
+        key = {'source': source, 'rows': int(arcpy.management.GetCount(source)[0]), 'lastEditDate': serviceEditDate(source)}
+        metaFile = os.path.join(entryDir, 'meta.json')
+        if os.path.exists(metaFile):
+            with open(metaFile) as f:
+                meta = json.load(f)
+            if all(meta.get(name) == value for name, value in key.items()):
+                table = np.load(os.path.join(entryDir, 'blocks.npy'))
+                if sampleMatches(blocks, table):
+                    meta['lastUsed'] = time.time()
+                    LODES_Cache.writeAtomic(metaFile, json.dumps(meta, indent=2))
+                    return table
+
+    rows = []
+    with arcpy.da.SearchCursor(blocks, ['GEOID', 'OID@']) as cur:
+        for geoid, oid in cur:
+            rows.append((int(geoid), oid))
+    table = np.sort(np.array(rows, dtype=LAYERDTYPE), order='geoid')
+    if entryDir:
+        os.makedirs(entryDir, exist_ok=True)
+        if os.path.exists(metaFile):
+            os.remove(metaFile)
+        np.save(os.path.join(entryDir, 'blocks.npy'), table)
+        key['lastUsed'] = time.time() #meta.json last, trimCache only counts entries that have one
+        LODES_Cache.writeAtomic(metaFile, json.dumps(key, indent=2))
+    return table
+
+# CREATE FUNCTION TO GET AREA CENTROIDS IN LONGITUDE/LATITUDE
+def geographicCentroids(centroids, spatialReference):
+    """Takes (codes, x, y) from LODES_Flows.areaCentroids in spatialReference and
+    returns them in longitude/latitude (NAD83) for great circle distances. Centroids
+    that are already geographic come back as they are."""
+    if spatialReference.type == 'Geographic':
+        return centroids
+    codes, x, y = centroids
+    nad83 = arcpy.SpatialReference(4269)
+    lon = np.empty(len(codes))
+    lat = np.empty(len(codes))
+    for i, (px, py) in enumerate(zip(x.tolist(), y.tolist())):
+        point = arcpy.PointGeometry(arcpy.Point(px, py), spatialReference).projectAs(nad83).firstPoint
+        lon[i], lat[i] = point.X, point.Y
+    return codes, lon, lat
+
+# CREATE FUNCTION TO LIST THE BLOCK ATTRIBUTE FIELDS TO COPY TO THE OUTPUTS
+def blockFields(blocks):
+    """Returns [name, type, alias, length] of every editable attribute field of the
+    blocks other than GEOID, in AddFields form. ObjectID, geometry, shape length/area
+    and other fields the geodatabase maintains are left out."""
+    fields = []
+    for field in arcpy.ListFields(blocks):
+        if field.type in FIELDTYPES and field.editable and not field.required and field.name.upper() != 'GEOID':
+            fields.append([field.name, FIELDTYPES[field.type], field.aliasName,
+                           field.length if field.type == 'String' else None])
+    return fields
+
+# CREATE FUNCTION TO NAME THE FIELDS OF AN OUTPUT FEATURE CLASS
+def joinedFields(statTable, tableName):
+    """Returns GEOID and the <tableName>_<field> names of a stat table's fields, in insert order."""
+    keyField = LODES_Core.statKeyField(statTable)
+    return ['GEOID'] + ['%s_%s' % (tableName, col) for col in statTable.columns if col != keyField]
+
+# CREATE FUNCTION TO CREATE AN EMPTY OUTPUT FEATURE CLASS FOR A STAT TABLE
+def createJoinedOutput(blocks, statTable, tableName, outFc):
+    """Creates outFc with the blocks' spatial reference, a GEOID field, the stat
+    table fields named <tableName>_<field> (same names AddJoin and CopyFeatures gave
+    them) and the block attribute fields (see blockFields). Returns the field names
+    to insert after SHAPE@, the block attribute fields last."""
+    outFields = joinedFields(statTable, tableName)
+    attrFields = blockFields(blocks)
+    if arcpy.Exists(outFc):
+        arcpy.management.Delete(outFc)
+    arcpy.management.CreateFeatureclass(os.path.dirname(outFc), os.path.basename(outFc), 'POLYGON',
+                                        spatial_reference=arcpy.Describe(blocks).spatialReference)
+    arcpy.management.AddFields(outFc, [['GEOID', 'TEXT', 'GEOID', LODES_Core.GEOIDLEN]]
+                               + [[field, 'LONG'] for field in outFields[1:]] + attrFields)
+    arcpy.management.AddIndex(outFc, 'GEOID', 'GEOID_idx') #incremental runs delete by GEOID
+    return outFields + [field[0] for field in attrFields]
+
+# CREATE FUNCTION TO FILL AN OUTPUT FEATURE CLASS WITH THE BLOCKS MATCHING A STAT TABLE
+def fillJoinedOutput(blocks, blockTable, statTable, outFc, outFields):
+    """Inserts the census blocks matching a stat table into outFc. Blocks are matched
+    by GEOID lookup in blockTable, and only the matched geometries are read, a few
+    ObjectID ranges at a time, so the time taken follows the size of the output rather
+    than the number of blocks. The block attribute fields in outFields (the ones after
+    the stat table's) are read from the blocks with the geometry. Only touches its own
+    cursors and outFc, so several can run at once in separate processes. Returns the
+    number of features written."""
+    keyField = LODES_Core.statKeyField(statTable)
+    attrFields = outFields[len(statTable.columns):] #GEOID stands in for the key field
+    oids, matched = LODES_BlockIndex.joinStatTable(blockTable, statTable, keyField)
+    valueFields = [col for col in matched.columns if col != keyField]
+    values = dict(zip(oids.tolist(), zip(matched[keyField].tolist(),
+                                         *[matched[col].astype('int64').tolist() for col in valueFields])))
+
+    oidField = arcpy.AddFieldDelimiters(blocks, arcpy.Describe(blocks).OIDFieldName)
+    written = 0
+    with arcpy.da.InsertCursor(outFc, ['SHAPE@'] + outFields) as ins:
+        for first, last in LODES_BlockIndex.idRanges(oids):
+            where = "%s >= %d AND %s <= %d" % (oidField, first, oidField, last)
+            with arcpy.da.SearchCursor(blocks, ['OID@', 'SHAPE@'] + attrFields, where) as cur:
+                for row in cur:
+                    if row[0] in values:
+                        ins.insertRow((row[1],) + values[row[0]] + row[2:])
+                        written += 1
+    return written
+
+# CREATE FUNCTION TO RUN ONE TASK PER OUTPUT
+def runOutputTasks(function, tasks, workers=None):
+    """Calls function(*args) for every output in tasks (dict of output name to args)
+    and yields (output name, result) as each one finishes. workers of 1 runs them one
+    at a time in this process. Otherwise each runs in a worker process: arcpy cursors
+    and geodatabase writes are not thread safe, and a process pool also gets past the
+    GIL. From a script tool call LODES_ToolUtils.useEnvironmentPython first."""
+    if workers == 1:
+        for outName, args in tasks.items():
+            yield outName, function(*args)
+        return
+
+    context = multiprocessing.get_context('spawn') #the same on every platform as on Windows
+    with ProcessPoolExecutor(max_workers=workers or len(tasks) or 1, mp_context=context) as pool:
+        futures = {pool.submit(function, *args): outName for outName, args in tasks.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+# CREATE FUNCTION TO GET WHAT A WORKER PROCESS NEEDS TO READ THE BLOCKS
+def workerBlocks(blocks, blockTable, statTable, workers=None):
+    """Returns (blocks, blockTable) to hand to an output task. For worker processes the
+    block layer becomes its catalog path, which each worker opens itself, and the block
+    table shrinks to the rows of the stat table's GEOIDs so only those are sent over."""
+    if workers == 1:
+        return blocks, blockTable
+    keyField = LODES_Core.statKeyField(statTable)
+    subset = np.sort(LODES_BlockIndex.blockRecords(blockTable, statTable[keyField].to_numpy()), order='geoid')
+    return arcpy.Describe(blocks).catalogPath, subset
+
+# CREATE FUNCTION TO WRITE SEVERAL JOINED OUTPUTS AT ONCE
+def writeJoinedOutputs(blocks, blockTable, outputs, outGDB, workers=None):
+    """Writes every output in outputs (dict of output name to (stat table name, stat
+    table)) to outGDB. The feature classes are created one after another first, so the
+    geodatabase schema is never changed by two tasks at once, then each one is filled
+    by its own worker process (see runOutputTasks). Yields (output name, features
+    written) as each output finishes."""
+    tasks = {}
+    for outName, (tableName, statTable) in outputs.items():
+        outFc = os.path.join(outGDB, outName)
+        outFields = createJoinedOutput(blocks, statTable, tableName, outFc)
+        tasks[outName] = workerBlocks(blocks, blockTable, statTable, workers) + (statTable, outFc, outFields)
+    yield from runOutputTasks(fillJoinedOutput, tasks, workers)
+
+# CREATE FUNCTION TO REPLACE SOME BLOCKS OF AN OUTPUT FEATURE CLASS
+def updateJoinedOutput(blocks, blockTable, statTable, outFc, outFields, deleteKeys):
+    """Deletes the features of outFc whose GEOID is in deleteKeys, then inserts the
+    census blocks matching statTable (see fillJoinedOutput). The deletes are IN queries
+    of DELETECHUNK GEOIDs on the output's GEOID index, so only the features being
+    replaced are read. Returns (features deleted, features written)."""
+    geoidField = arcpy.AddFieldDelimiters(outFc, 'GEOID')
+    deleteKeys = deleteKeys.tolist()
+    deleted = 0
+    for start in range(0, len(deleteKeys), DELETECHUNK):
+        where = "%s IN (%s)" % (geoidField, ', '.join("'%s'" % key for key in deleteKeys[start:start + DELETECHUNK]))
+        with arcpy.da.UpdateCursor(outFc, ['GEOID'], where) as cur:
+            for row in cur:
+                cur.deleteRow()
+                deleted += 1
+    return deleted, fillJoinedOutput(blocks, blockTable, statTable, outFc, outFields)
+
+# CREATE FUNCTION TO UPDATE SEVERAL JOINED OUTPUTS AT ONCE
+def updateJoinedOutputs(blocks, blockTable, changes, outGDB, workers=None):
+    """Updates existing outputs in outGDB in place for an incremental run. changes is
+    a dict of output name to (stat table name, GEOIDs to delete, stat table rows to
+    insert), see LODES_Incremental.outputChanges. Each output is updated by its own task
+    like writeJoinedOutputs. Yields (output name, features deleted, features written)."""
+    attrFields = [field[0] for field in blockFields(blocks)]
+    tasks = {}
+    for outName, (tableName, deleteKeys, statTable) in changes.items():
+        outFc = os.path.join(outGDB, outName)
+        outNames = set(field.name for field in arcpy.ListFields(outFc))
+        outFields = joinedFields(statTable, tableName) + [field for field in attrFields if field in outNames]
+        tasks[outName] = workerBlocks(blocks, blockTable, statTable, workers) + (statTable, outFc, outFields, deleteKeys)
+    for outName, (deleted, written) in runOutputTasks(updateJoinedOutput, tasks, workers):
+        yield outName, deleted, written
+
+# CREATE FUNCTION TO FINGERPRINT THE OUTPUTS OF A RUN
+def outputFingerprint(outGDB, outNames):
+    """Returns {output name: [feature count, highest ObjectID]} for the outputs in
+    outGDB, None for one that doesn't exist. Any insert raises the highest ObjectID and
+    any delete lowers the count, so an output changed outside an incremental run no
+    longer matches the fingerprint saved with its state (see LODES_Incremental)."""
+    fingerprint = {}
+    for outName in outNames:
+        outFc = os.path.join(outGDB, outName)
+        if not arcpy.Exists(outFc):
+            fingerprint[outName] = None
+            continue
+        oidField = arcpy.Describe(outFc).OIDFieldName
+        with arcpy.da.SearchCursor(outFc, ['OID@'], sql_clause=(None, 'ORDER BY %s DESC' % oidField)) as cur:
+            maxOid = next(cur, (0,))[0]
+        fingerprint[outName] = [int(arcpy.management.GetCount(outFc)[0]), maxOid]
+    return fingerprint
+
+# CREATE FUNCTION TO FIND THE BLOCK LAYER INSIDE A LAYER ADDED FROM THE LIVING ATLAS
+def findBlockLayer(layer):
+    """Returns the first feature layer in layer or, for a group layer, its sublayers
+    that holds census blocks. Block group and tract sublayers have a GEOID field too,
+    so a layer only counts if its GEOID is long enough for a block and one sampled
+    value is a 15 digit block GEOID. Reads one row rather than counting features."""
+    layers = layer.listLayers() if layer.isGroupLayer else [layer]
+    for sublayer in layers:
+        if sublayer.isFeatureLayer and isBlockLayer(sublayer):
+            return sublayer
+    raise ValueError("No census block layer with 15 digit block GEOIDs in %s" % layer.name)
+
+# CREATE FUNCTION TO CHECK A LAYER HOLDS CENSUS BLOCKS
+def isBlockLayer(layer):
+    """Returns True if layer has a GEOID field that holds block GEOIDs, checked from
+    the field length and the first feature's value."""
+    fields = arcpy.ListFields(layer, 'GEOID')
+    if not fields or (fields[0].type == 'String' and fields[0].length < LODES_Core.GEOIDLEN):
+        return False
+    with arcpy.da.SearchCursor(layer, 'GEOID') as cur:
+        row = next(cur, None)
+    if row is None or row[0] is None:
+        return False
+    value = row[0] if isinstance(row[0], str) else str(int(row[0]))
+    return len(value.strip()) == LODES_Core.GEOIDLEN and value.strip().isdigit()
+
+
+
+##---------------------------------------------------------------------------------------------------
+# SCRIPT TOOL, build a store
+if __name__ == '__main__':
+    tigerFiles = [f.strip("'") for f in arcpy.GetParameterAsText(0).split(';')]
+    storeFolder = arcpy.GetParameterAsText(1)
+    arcpy.env.overwriteOutput = True
+    arcpy.SetProgressor("", "Building census block store")
+    fc = buildBlockStore(tigerFiles, storeFolder)
+    arcpy.AddMessage("Built %s with %s blocks" % (fc, arcpy.management.GetCount(fc)))
@@ -0,0 +1,275 @@
+###############################################
+# Title: LODES Cache
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: On-disk columnar cache of parsed LODES csv.gz files. The first run against a file
+# decompresses and parses it once into one raw binary file per column, later runs memory map only
+# the columns they need instead of re-reading the csv.gz. No arcpy, same as LODES_Core.py.
+# Cache layout:
+#   <cacheDir>/keys/<sha1 of path|size|mtime>   text file holding the content hash of that file
+#   <cacheDir>/<content hash>/meta.json         source, layout, row count, column dtypes, last used time
+#   <cacheDir>/<content hash>/<column>.bin      raw little-endian column values, rows sorted by h_geocode
+#                                               (w_geocode for WAC files)
+#   <cacheDir>/<content hash>/w_geocode.sorted.bin, w_geocode.order.bin
+#                                               OD only, w_geocode ascending and the row order that gives it
+#   <cacheDir>/blocks_<sha1 of layer source>/   GEOID/ObjectID table of a block layer with no store, its meta.json
+#                                               has lastUsed too so trimCache counts it (see LODES_Blocks.layerBlockTable)
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import LODES_Core
+
+# CACHE SETTINGS
+CACHEVERSION = 2 #bump when the entry layout changes, older entries are rebuilt
+CACHEDIR = os.path.join(os.path.expanduser('~'), 'LODES_Cache') #default cache folder
+MAXCACHEBYTES = 20 * 1024 ** 3 #least recently used entries are removed once the cache folder is bigger than this
+HASHBLOCK = 4 * 1024 ** 2 #bytes read at a time while hashing a file
+SORTROWS = 2000000 #rows held in memory at a time while sorting a new entry, so a first run's memory doesn't grow with the state
+SAMPLEPERBUCKET = 1000 #key values sampled per sort bucket to place the bucket boundaries
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO HASH THE CONTENTS OF A FILE
+def contentHash(path):
+    """Returns the blake2b hex digest of the file's bytes."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASHBLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# CREATE FUNCTION TO GET THE CONTENT HASH, ONLY HASHING WHEN THE FILE IS NEW OR HAS CHANGED
+def cacheKey(lodes, cacheDir=CACHEDIR):
+    """Returns the content hash used to name the cache entry for a LODES file.
+    The hash is remembered against the file's path, size and modified time, so an
+    unchanged file is only hashed once. A moved or touched copy of the same data
+    is hashed again but still finds the same entry."""
+    st = os.stat(lodes)
+    statKey = '%s|%d|%d' % (os.path.abspath(lodes), st.st_size, st.st_mtime_ns)
+    keyFile = os.path.join(cacheDir, 'keys', hashlib.sha1(statKey.encode('utf-8')).hexdigest())
+    if os.path.exists(keyFile):
+        with open(keyFile) as f:
+            return f.read().strip()
+
+    key = contentHash(lodes)
+    os.makedirs(os.path.dirname(keyFile), exist_ok=True)
+    writeAtomic(keyFile, key)
+    return key
+
+# CREATE FUNCTION TO WRITE A SMALL TEXT FILE WITHOUT LEAVING HALF WRITTEN COPIES
+def writeAtomic(path, text):
+    """Writes text to path through a temporary file and a rename."""
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+# CREATE FUNCTION TO CONVERT A LODES CSV.GZ INTO A CACHE ENTRY
+def buildCacheEntry(lodes, entryDir, chunksize=LODES_Core.CHUNKSIZE):
+    """Streams every geocode and job column of a LODES file into entryDir, one .bin
+    file per column, and writes meta.json last. The entry is built in a temporary
+    folder and renamed into place, so a crashed run never leaves a partial entry."""
+    layout = LODES_Core.lodesLayout(lodes)
+    header = pd.read_csv(lodes, compression='gzip', nrows=0).columns
+    geoCols, jobCols = LODES_Core.LAYOUTS[layout]
+    jobCols = [col for col in jobCols if col in header] #older LODES releases are missing some segments
+    dtypes = dict.fromkeys(geoCols, '<i8')
+    dtypes.update(dict.fromkeys(jobCols, '<i4'))
+
+    tmpDir = '%s.%d.tmp' % (entryDir, os.getpid())
+    os.makedirs(tmpDir, exist_ok=True)
+    rows = 0
+    files = {col: open(os.path.join(tmpDir, col + '.bin'), 'wb') for col in dtypes}
+    try:
+        reader = pd.read_csv(lodes, compression='gzip', usecols=list(dtypes), dtype=dtypes, chunksize=chunksize)
+        for chunk in reader:
+            for col, f in files.items():
+                chunk[col].to_numpy().tofile(f)
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        'version': CACHEVERSION,
+        'source': os.path.abspath(lodes),
+        'layout': layout,
+        'rows': rows,
+        'columns': dtypes,
+        'lastUsed': time.time(),
+    }
+    meta.update(sortCacheEntry(tmpDir, dtypes))
+    writeAtomic(os.path.join(tmpDir, 'meta.json'), json.dumps(meta, indent=2))
+    try:
+        os.replace(tmpDir, entryDir)
+    except OSError: #another process finished the same entry first, keep theirs
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+# CREATE FUNCTION TO READ A RANGE OF ROWS FROM A COLUMN FILE
+def readRows(path, dtype, start, count):
+    """Returns rows start to start + count of a raw column file, read into memory."""
+    return np.fromfile(path, dtype=dtype, count=count, offset=start * np.dtype(dtype).itemsize)
+
+# CREATE FUNCTION TO SPLIT A KEY COLUMN INTO SORT BUCKETS
+def bucketEdges(keyPath, keyDtype, rows, chunkRows=SORTROWS):
+    """Returns the key values that split a key column into buckets of about chunkRows
+    rows each, from evenly spaced samples read chunkRows at a time. Every row with the
+    same key lands in the same bucket."""
+    buckets = -(-rows // chunkRows)
+    if buckets <= 1:
+        return np.empty(0, dtype=keyDtype)
+    step = max(1, rows // (buckets * SAMPLEPERBUCKET))
+    sample = np.concatenate([readRows(keyPath, keyDtype, start, min(chunkRows, rows - start))[::step]
+                             for start in range(0, rows, chunkRows)])
+    return np.unique(np.quantile(sample, np.linspace(0, 1, buckets + 1)[1:-1], method='lower'))
+
+# CREATE FUNCTION TO SORT COLUMN FILES BY A KEY COLUMN WITHOUT LOADING THEM WHOLE
+def sortByKey(keyPath, keyDtype, columns, rows, workDir, chunkRows=SORTROWS):
+    """Writes each of columns ((source path, dtype, output path), a source of None
+    meaning the row position) to its output path in ascending key order, the same
+    order as a stable argsort of the key column, which must be one of the sources.
+    A bucket sort on disk: rows are spread over key range buckets chunkRows at a time,
+    then each bucket is sorted in memory and appended to the outputs, so memory stays
+    around chunkRows rows per column whatever the file size."""
+    edges = bucketEdges(keyPath, keyDtype, rows, chunkRows)
+    bucketPath = os.path.join(workDir, 'bucket.bin')
+    with open(bucketPath, 'wb') as f:
+        for start in range(0, rows, chunkRows):
+            key = readRows(keyPath, keyDtype, start, min(chunkRows, rows - start))
+            np.searchsorted(edges, key, 'right').astype('<u4').tofile(f)
+
+    # spread each column over the buckets, rows keep their file order within a bucket
+    parts = [os.path.join(workDir, 'column%d' % i) for i in range(len(columns))]
+    for part, (source, dtype, outPath) in zip(parts, columns):
+        files = [open('%s.%d' % (part, b), 'wb') for b in range(len(edges) + 1)]
+        try:
+            for start in range(0, rows, chunkRows):
+                count = min(chunkRows, rows - start)
+                bucket = readRows(bucketPath, '<u4', start, count)
+                values = readRows(source, dtype, start, count) if source else np.arange(start, start + count, dtype=dtype)
+                order = np.argsort(bucket, kind='stable')
+                bounds = np.searchsorted(bucket[order], np.arange(len(files) + 1))
+                values = values[order]
+                for b, f in enumerate(files):
+                    values[bounds[b]:bounds[b + 1]].tofile(f)
+        finally:
+            for f in files:
+                f.close()
+    os.remove(bucketPath)
+
+    # sort each bucket on its keys and append it to every output
+    keyPart = parts[[source for source, dtype, outPath in columns].index(keyPath)]
+    outputs = [open(outPath + '.sorting', 'wb') for source, dtype, outPath in columns]
+    try:
+        for b in range(len(edges) + 1):
+            order = np.argsort(np.fromfile('%s.%d' % (keyPart, b), dtype=keyDtype), kind='stable')
+            for part, (source, dtype, outPath), f in zip(parts, columns, outputs):
+                np.fromfile('%s.%d' % (part, b), dtype=dtype)[order].tofile(f)
+            for part in parts:
+                os.remove('%s.%d' % (part, b))
+    finally:
+        for f in outputs:
+            f.close()
+    for source, dtype, outPath in columns:
+        os.replace(outPath + '.sorting', outPath)
+
+# CREATE FUNCTION TO SORT A NEW CACHE ENTRY BY GEOCODE
+def sortCacheEntry(entryDir, dtypes, chunkRows=SORTROWS):
+    """Rewrites every column of an entry in h_geocode order (w_geocode if there is no
+    h_geocode), and for OD files also writes w_geocode in ascending order with the row
+    order that produces it. Returns the index part of meta.json. This is the one time
+    the whole file is sorted, chunkRows rows at a time (see sortByKey), every later run
+    does range lookups with LODES_Core.filterIndexed."""
+    sortedBy = 'h_geocode' if 'h_geocode' in dtypes else 'w_geocode'
+
+    def columnPath(col):
+        return os.path.join(entryDir, col + '.bin')
+
+    rows = os.path.getsize(columnPath(sortedBy)) // np.dtype(dtypes[sortedBy]).itemsize
+    sortByKey(columnPath(sortedBy), dtypes[sortedBy],
+              [(columnPath(col), dtype, columnPath(col)) for col, dtype in dtypes.items()], rows, entryDir, chunkRows)
+
+    secondary = [col for col in dtypes if col in LODES_Core.KEYFIELDS and col != sortedBy]
+    for col in secondary:
+        sortByKey(columnPath(col), dtypes[col], [(columnPath(col), dtypes[col], columnPath(col + '.sorted')),
+                                                 (None, '<i8', columnPath(col + '.order'))], rows, entryDir, chunkRows)
+    return {'sortedBy': sortedBy, 'secondary': secondary}
+
+# CREATE FUNCTION TO OPEN A CACHED LODES FILE
+def openCache(lodes, cacheDir=CACHEDIR, maxBytes=MAXCACHEBYTES):
+    """Returns (columns, index, layout) for a LODES file, building the cache entry first
+    if the file has not been seen before or has changed. columns is a dict of read only
+    numpy memory maps, so nothing is read from disk until a column is sliced. index is
+    the sorted geocode index in the form LODES_Core.filterIndexed expects."""
+    key = cacheKey(lodes, cacheDir)
+    entryDir = os.path.join(cacheDir, key)
+    metaFile = os.path.join(entryDir, 'meta.json')
+    meta = None
+    if os.path.exists(metaFile):
+        with open(metaFile) as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHEVERSION:
+            shutil.rmtree(entryDir, ignore_errors=True)
+            meta = None
+    if meta is None:
+        buildCacheEntry(lodes, entryDir)
+        with open(metaFile) as f:
+            meta = json.load(f)
+
+    meta['lastUsed'] = time.time()
+    writeAtomic(metaFile, json.dumps(meta, indent=2))
+    trimCache(cacheDir, maxBytes, keep=key)
+
+    def mapColumn(name, dtype):
+        if not meta['rows']: #numpy can't map an empty file
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(entryDir, name + '.bin'), dtype=dtype, mode='r', shape=(meta['rows'],))
+
+    columns = {col: mapColumn(col, dtype) for col, dtype in meta['columns'].items()}
+    index = {
+        'sortedBy': meta['sortedBy'],
+        'secondary': {col: (mapColumn(col + '.sorted', meta['columns'][col]), mapColumn(col + '.order', '<i8'))
+                      for col in meta['secondary']},
+    }
+    return columns, index, meta['layout']
+
+# CREATE FUNCTION TO KEEP THE CACHE FOLDER UNDER ITS SIZE CAP
+def trimCache(cacheDir=CACHEDIR, maxBytes=MAXCACHEBYTES, keep=None):
+    """Deletes least recently used entries until the cache folder is under maxBytes.
+    The entry named keep (the one in use) is never deleted."""
+    entries = []
+    for name in os.listdir(cacheDir):
+        metaFile = os.path.join(cacheDir, name, 'meta.json')
+        if not os.path.exists(metaFile):
+            continue
+        with open(metaFile) as f:
+            lastUsed = json.load(f)['lastUsed']
+        size = sum(e.stat().st_size for e in os.scandir(os.path.join(cacheDir, name)))
+        entries.append((lastUsed, name, size))
+
+    total = sum(size for lastUsed, name, size in entries)
+    for lastUsed, name, size in sorted(entries):
+        if total <= maxBytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(cacheDir, name), ignore_errors=True)
+        total -= size
+
+# CREATE FUNCTION TO READ A LODES FILE THROUGH THE CACHE
+def readLodesCached(lodes, blockList, jobCols=None, cacheDir=CACHEDIR, maxBytes=MAXCACHEBYTES):
+    """Drop in replacement for LODES_Core.readLodes that goes through the cache and its
+    sorted geocode index. Returns the rows touching the study area with the geocode
+    columns and jobCols, in h_geocode order rather than file order."""
+    columns, index, layout = openCache(lodes, cacheDir, maxBytes)
+    return LODES_Core.filterIndexed(columns, index, blockList, layout, jobCols)
@@ -0,0 +1,154 @@
+###############################################
+# Title: LODES Check Incremental
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Checks that an incremental rerun (LODES_Incremental.py) gives the same result as a full run,
+# outside of ArcGIS Pro. A synthetic OD file (see LODES_Benchmark.py) is cached, a base study area is run and
+# its state saved, then each changed study area is run both ways and compared: the cache rows, the classified
+# parts, every stat table, and every output after the base output has the incremental deletes and inserts applied.
+# Cases: unchanged (same blocks), added (neighbouring blocks added), removed (blocks dropped), mixed (both)
+# Usage:
+#   python LODES_Check_Incremental.py --rows 1000000 --blocks 5000 --out check
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import argparse
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+import LODES_Core
+import LODES_Cache
+import LODES_Incremental
+import LODES_Benchmark
+
+# CHECK SETTINGS
+DEFAULTROWS = 1000000
+DEFAULTBLOCKS = 5000
+DEFAULTUNIVERSE = 100000
+CHANGESHARE = 0.05 #share of the base study area's blocks added or removed in each case
+FINGERPRINT = {'synthetic': [0, 0]} #stands in for LODES_Blocks.outputFingerprint, there are no feature classes here
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO BUILD THE CHANGED STUDY AREAS
+def changedAreas(geoids, base, share=CHANGESHARE):
+    """Returns {case name: block GEOIDs} for each case, built from the base study area
+    and the blocks that follow it in the synthetic state."""
+    change = max(1, int(len(base) * share))
+    start = np.searchsorted(geoids, base[-1]) + 1
+    following = geoids[start:start + change]
+    return {
+        'unchanged': base.copy(),
+        'added': np.union1d(base, following),
+        'removed': base[change:],
+        'mixed': np.union1d(base[change:], following),
+    }
+
+# CREATE FUNCTION TO RUN A STUDY AREA IN FULL
+def fullRun(columns, index, layout, blockList, jobCols):
+    """Returns (rows, parts, statTables) of a full run, the way the script tool does it."""
+    rows = LODES_Core.indexedRows(columns, index, blockList)
+    od = LODES_Core.takeRows(columns, rows, layout, jobCols)
+    parts, statTables = LODES_Core.classifyOD(od, blockList, jobCols)
+    return rows, parts, statTables
+
+# CREATE FUNCTION TO APPLY AN INCREMENTAL RUN'S OUTPUT CHANGES TO THE PREVIOUS OUTPUT
+def applyChanges(table, deleteKeys, insert):
+    """Returns table with the rows keyed on deleteKeys (GEOID text) removed and insert's
+    rows added, sorted by key, what LODES_Blocks.updateJoinedOutput does to a feature class."""
+    keyField = LODES_Core.statKeyField(table)
+    kept = table[~np.isin(table[keyField].to_numpy().astype('int64'), deleteKeys.astype('int64'))]
+    merged = pd.concat([kept, insert], ignore_index=True)
+    return merged.sort_values(keyField, kind='stable', ignore_index=True)
+
+# CREATE FUNCTION TO COMPARE TWO DATAFRAMES
+def sameFrame(left, right):
+    """Returns '' if the dataframes hold the same values and dtypes, else what differs."""
+    try:
+        pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True))
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return ''
+
+# CREATE FUNCTION TO CHECK ONE CHANGED STUDY AREA
+def checkCase(columns, index, layout, state, base, baseStatTables, blockList, jobCols):
+    """Runs blockList incrementally from state and in full and returns a list of what
+    differs, empty if the two agree."""
+    update = LODES_Incremental.updateRun(columns, index, state, blockList, jobCols, maxChange=1.0)
+    rows, parts, statTables = fullRun(columns, index, layout, blockList, jobCols)
+    problems = []
+    if not np.array_equal(update['rows'], rows):
+        problems.append("cache rows differ, %d incremental and %d full" % (len(update['rows']), len(rows)))
+    for name in parts:
+        diff = sameFrame(update['parts'][name], parts[name])
+        if diff:
+            problems.append("part %s: %s" % (name, diff))
+    for name in statTables:
+        diff = sameFrame(update['statTables'][name], statTables[name])
+        if diff:
+            problems.append("%s: %s" % (name, diff))
+
+    changes = LODES_Incremental.outputChanges(update['statTables'], update['changedKeys'], blockList)
+    for outName, (tableName, deleteKeys, insert) in changes.items():
+        before = LODES_Core.outputTable(baseStatTables, outName, base)
+        after = LODES_Core.outputTable(statTables, outName, blockList)
+        diff = sameFrame(applyChanges(before, deleteKeys, insert), after)
+        if diff:
+            problems.append("output %s: %s" % (outName, diff))
+    return problems
+
+# CREATE FUNCTION TO RUN EVERY CASE
+def runChecks(outDir, rows=DEFAULTROWS, blocks=DEFAULTBLOCKS, universe=DEFAULTUNIVERSE, jobCols=None,
+              seed=0, message=print):
+    """Generates (or reuses) a synthetic OD file in outDir, saves the state of a base
+    study area of blocks blocks and checks every case against it. Returns
+    {case name: list of differences}."""
+    os.makedirs(outDir, exist_ok=True)
+    geoids, county = LODES_Benchmark.blockUniverse(universe, seed)
+    lodes = os.path.join(outDir, 'synthetic_od_%d_%d.csv.gz' % (rows, seed))
+    message("Generating %s" % lodes)
+    LODES_Benchmark.writeSyntheticOD(lodes, rows, geoids, county, seed)
+    columns, index, layout = LODES_Cache.openCache(lodes, os.path.join(outDir, 'cache'), maxBytes=float('inf'))
+    jobCols = LODES_Core.selectJobCols(layout, jobCols)
+
+    base = LODES_Benchmark.studyArea(geoids, blocks, seed)
+    baseRows, baseParts, baseStatTables = fullRun(columns, index, layout, base, jobCols)
+    stateDir = os.path.join(outDir, 'state')
+    shutil.rmtree(stateDir, ignore_errors=True)
+    LODES_Incremental.saveState(stateDir, 'synthetic', jobCols, outDir, base, baseRows, baseStatTables, FINGERPRINT)
+    state = LODES_Incremental.loadState(stateDir, 'synthetic', jobCols, outDir, FINGERPRINT)
+
+    results = {}
+    for case, blockList in changedAreas(geoids, base).items():
+        results[case] = checkCase(columns, index, layout, state, base, baseStatTables, blockList, jobCols)
+        added, removed = LODES_Incremental.diffBlocks(base, blockList)
+        message("%s (%d blocks added, %d removed): %s" % (case, len(added), len(removed),
+                                                         'same as a full run' if not results[case] else 'DIFFERENT'))
+        for problem in results[case]:
+            message("    " + problem)
+    return results
+
+
+
+##---------------------------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Check incremental LODES reruns against full runs on a synthetic OD file.")
+    parser.add_argument('--out', default='LODES_Check_Output', help="folder for the synthetic file, cache and state")
+    parser.add_argument('--rows', type=int, default=DEFAULTROWS, help="OD rows in the synthetic file")
+    parser.add_argument('--blocks', type=int, default=DEFAULTBLOCKS, help="census blocks in the base study area")
+    parser.add_argument('--universe', type=int, default=DEFAULTUNIVERSE, help="census blocks in the synthetic state")
+    parser.add_argument('--jobcols', nargs='+', default=None, help="job columns to sum, default all")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = runChecks(args.out, args.rows, args.blocks, args.universe, args.jobcols, args.seed)
+    sys.exit(1 if any(results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
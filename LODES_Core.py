@@ -0,0 +1,325 @@
+###############################################
+# Title: LODES Core
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Reading and filtering of LODES csv.gz data for LODES_Script_Tool.py. Nothing in here
+# touches arcpy, so these functions can be imported and run outside of an ArcPro session.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import numpy as np
+import pandas as pd
+
+# LODES COLUMNS
+ODGEOCOLS = ['w_geocode', 'h_geocode'] #origin-destination files are keyed on both work and home census block
+ODJOBCOLS = ['S000', 'SA01', 'SA02', 'SA03', 'SE01', 'SE02', 'SE03', 'SI01', 'SI02', 'SI03'] #job counts in the OD files, createdate is left out
+# area characteristics, shared by the residence (RAC) and workplace (WAC) files
+RACJOBCOLS = (['C000', 'CA01', 'CA02', 'CA03', 'CE01', 'CE02', 'CE03']
+              + ['CNS%02d' % i for i in range(1, 21)]
+              + ['CR01', 'CR02', 'CR03', 'CR04', 'CR05', 'CR07', 'CT01', 'CT02', 'CD01', 'CD02', 'CD03', 'CD04', 'CS01', 'CS02'])
+WACJOBCOLS = RACJOBCOLS + ['CFA%02d' % i for i in range(1, 6)] + ['CFS%02d' % i for i in range(1, 6)] #WAC adds firm age and size
+
+# LODES FILE LAYOUTS
+# layout: (geocode columns, job columns)
+LAYOUTS = {
+    'od': (ODGEOCOLS, ODJOBCOLS),
+    'rac': (['h_geocode'], RACJOBCOLS), #residence area characteristics, keyed on home block only
+    'wac': (['w_geocode'], WACJOBCOLS), #workplace area characteristics, keyed on work block only
+}
+
+# FLOW CATEGORIES
+# name: (home block in study area, work block in study area), None means either
+FLOWCATEGORIES = {
+    'liveIn': (True, None), #df, residents of the study area regardless of work location
+    'liveInWorkOut': (True, False), #df2, residents who leave the study area for work
+    'liveInWorkIn': (True, True), #df3, residents who stay in the study area for work
+    'liveOutWorkIn': (False, True), #df4, non-residents who come into the study area for work
+}
+
+# GROUP BY SUMS, one per stat table in the script tool
+# name: (flow category, geocode to group by)
+FLOWSUMS = {
+    'statTable1': ('liveIn', 'w_geocode'), #work locations of residents
+    'statTable2': ('liveInWorkOut', 'h_geocode'), #home locations of residents working outside
+    'statTable3': ('liveInWorkIn', 'h_geocode'), #home locations of residents working inside
+    'statTable4': ('liveOutWorkIn', 'h_geocode'), #home locations of non-residents
+    'statTable5': ('liveOutWorkIn', 'w_geocode'), #work locations of non-residents
+}
+
+# OUTPUT LAYERS, the stat table joined to census blocks for each output feature class
+# name: (stat table, blocks to keep: 'inside' or 'outside' the study area, None for all)
+OUTPUTLAYERS = {
+    'residentWorkLocationsInSA': ('statTable1', 'inside'), #work locations for live in SA and work in SA
+    'residentWorkLocationsOutsideSA': ('statTable1', 'outside'), #work locations for live in SA, work outside SA
+    'residentHomeLocWorkOutsideSA': ('statTable2', None), #home locations for live in SA work outside SA
+    'residentHomeLocWorkInsideSA': ('statTable3', None), #home locations for live in SA work inside SA
+    'nonResidentHomeLocations': ('statTable4', None), #home locations for non-resident workers
+    'nonResidentWorkLocations': ('statTable5', None), #work locations for non-resident workers
+}
+
+# STAT TABLE LAYOUT
+GEOIDLEN = 15 #census block GEOIDs are 15 characters, state FIPS codes below 10 keep their leading zero as text
+KEYFIELDS = {'w_geocode': 'w_geo_txt', 'h_geocode': 'h_geo_txt'} #text key field used to join each stat table to census block GEOID
+
+# GEOID PREFIXES, number of leading GEOID digits for each level of the census hierarchy
+COUNTYDIGITS = 5 #state (2) + county (3)
+TRACTDIGITS = 11 #county + tract (6), a block's last 4 digits are the block itself
+
+# READ SETTINGS
+CHUNKSIZE = 1000000 #rows per chunk while decompressing, about 80MB per chunk with the compact dtypes below
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO BUILD A LOOKUP ARRAY FROM THE STUDY AREA BLOCK LIST
+def buildBlockIndex(blockList):
+    """Takes a list of census block GEOIDs (ints or strings) and returns a sorted,
+    de-duplicated int64 array for use with inBlocks."""
+    if not isinstance(blockList, np.ndarray):
+        blockList = list(blockList) #sets and generators
+    return np.unique(np.asarray(blockList, dtype='int64'))
+
+# CREATE FUNCTION TO TEST GEOCODES AGAINST THE BLOCK INDEX
+def inBlocks(geocodes, blocks):
+    """Returns a boolean mask, True where the geocode is in the sorted block index.
+    Uses a binary search per geocode rather than building a new set every call."""
+    geocodes = np.asarray(geocodes, dtype='int64')
+    if len(blocks) == 0:
+        return np.zeros(len(geocodes), dtype=bool)
+    pos = np.searchsorted(blocks, geocodes)
+    pos[pos == len(blocks)] = 0 #geocodes past the last block can't match, point them at any valid slot
+    return blocks[pos] == geocodes
+
+# CREATE FUNCTION TO FIND ROWS WITH ANY GEOCODE IN THE STUDY AREA
+def touchesBlocks(columns, geoCols, blocks):
+    """Returns a boolean mask, True where any of the geoCols is in the block index.
+    columns can be a dataframe or a dict of arrays."""
+    keep = inBlocks(columns[geoCols[0]], blocks)
+    for col in geoCols[1:]:
+        keep |= inBlocks(columns[col], blocks)
+    return keep
+
+# CREATE FUNCTION TO WORK OUT WHICH KIND OF LODES FILE THIS IS
+def lodesLayout(lodes):
+    """Reads only the header row of a LODES csv.gz and returns 'od', 'rac' or 'wac'."""
+    header = pd.read_csv(lodes, compression='gzip', nrows=0).columns
+    if 'w_geocode' in header and 'h_geocode' in header:
+        return 'od'
+    if 'h_geocode' in header:
+        return 'rac'
+    if 'w_geocode' in header:
+        return 'wac'
+    raise ValueError("%s is not a LODES OD, RAC or WAC file, no w_geocode or h_geocode column" % lodes)
+
+# CREATE FUNCTION TO PICK THE JOB COLUMNS TO READ AND SUM
+def selectJobCols(layout, jobCols=None):
+    """Returns the list of job columns to read for a layout. jobCols of None means
+    every job column in the layout, otherwise the names are checked against it."""
+    allJobCols = LAYOUTS[layout][1]
+    if not jobCols:
+        return list(allJobCols)
+    jobCols = list(dict.fromkeys(jobCols)) #drop repeats, keep order
+    unknown = [col for col in jobCols if col not in allJobCols]
+    if unknown:
+        raise ValueError("%s not in the LODES %s job columns" % (', '.join(unknown), layout.upper()))
+    return jobCols
+
+# CREATE FUNCTION TO READ A LODES FILE ONE CHUNK AT A TIME, KEEPING ONLY ROWS THAT TOUCH THE STUDY AREA
+def readLodes(lodes, blockList, jobCols=None, layout=None, chunksize=CHUNKSIZE):
+    """Streams a LODES csv.gz and returns a single dataframe of the rows that touch
+    the study area. For OD files that is any row where the home block, the work block,
+    or both are in the study area, for RAC/WAC files it is rows where the one geocode is.
+    Only the geocode columns and jobCols (see selectJobCols) are read. Each chunk is
+    filtered as it is decompressed, so memory scales with the study area rather than
+    the state file. Pass OD results to classifyOD to split them into flow categories."""
+
+    if layout is None:
+        layout = lodesLayout(lodes)
+    geoCols = LAYOUTS[layout][0]
+    jobCols = selectJobCols(layout, jobCols)
+
+    # Compact dtypes, geocodes are 15 digits and fit in int64, job counts fit in int32
+    dtypes = dict.fromkeys(geoCols, 'int64')
+    dtypes.update(dict.fromkeys(jobCols, 'int32'))
+
+    blocks = buildBlockIndex(blockList)
+
+    # Keep any row where either end is in the study area, everything else is dropped chunk by chunk
+    kept = []
+    reader = pd.read_csv(lodes, compression='gzip', usecols=geoCols + jobCols, dtype=dtypes, chunksize=chunksize)
+    for chunk in reader:
+        kept.append(chunk[touchesBlocks(chunk, geoCols, blocks)])
+
+    if not kept:
+        return pd.DataFrame({col: pd.Series(dtype=dtypes[col]) for col in geoCols + jobCols})
+    return pd.concat(kept, ignore_index=True)[geoCols + jobCols]
+
+# CREATE FUNCTION TO FILTER ALREADY LOADED LODES COLUMNS BY STUDY AREA
+def filterColumns(columns, blockList, layout, jobCols=None, chunksize=CHUNKSIZE):
+    """Same result as readLodes, but from a dict of column arrays (e.g. the memory
+    mapped arrays from LODES_Cache) instead of a csv.gz. The arrays are tested a chunk
+    at a time so a memory map is never pulled into RAM all at once, and only matching
+    rows of the job columns are ever read."""
+    geoCols = LAYOUTS[layout][0]
+    jobCols = selectJobCols(layout, jobCols)
+    blocks = buildBlockIndex(blockList)
+
+    rows = len(columns[geoCols[0]])
+    keepIdx = [np.empty(0, dtype='int64')]
+    for start in range(0, rows, chunksize):
+        chunk = {col: columns[col][start:start + chunksize] for col in geoCols}
+        keepIdx.append(np.flatnonzero(touchesBlocks(chunk, geoCols, blocks)) + start)
+    idx = np.concatenate(keepIdx)
+    return pd.DataFrame({col: np.asarray(columns[col][idx]) for col in geoCols + jobCols})
+
+# CREATE FUNCTION TO GET THE GEOCODE RANGES COVERED BY THE STUDY AREA
+def prefixRanges(blocks, digits=TRACTDIGITS):
+    """Returns (lo, hi) int64 arrays, one half open geocode range per distinct
+    county/tract prefix in the block index. A study area that sits in a few tracts
+    gives a few ranges no matter how many blocks it has."""
+    scale = 10 ** (GEOIDLEN - digits)
+    prefixes = np.unique(np.asarray(blocks, dtype='int64') // scale)
+    return prefixes * scale, (prefixes + 1) * scale
+
+# CREATE FUNCTION TO FIND STUDY AREA BLOCKS IN A SORTED GEOCODE COLUMN
+def matchSorted(sortedValues, blocks, digits=TRACTDIGITS):
+    """Returns the positions in sortedValues (ascending, e.g. a memory mapped column)
+    whose geocode is in the block index. searchsorted finds each prefix range, and
+    only the rows inside those ranges are read and checked for exact block membership."""
+    lo, hi = prefixRanges(blocks, digits)
+    starts = np.searchsorted(sortedValues, lo, 'left')
+    stops = np.searchsorted(sortedValues, hi, 'left')
+    positions = [np.empty(0, dtype='int64')]
+    for start, stop in zip(starts, stops):
+        if stop > start:
+            values = np.asarray(sortedValues[start:stop])
+            positions.append(np.flatnonzero(inBlocks(values, blocks)) + start)
+    return np.concatenate(positions)
+
+# CREATE FUNCTION TO FILTER SORTED LODES COLUMNS BY STUDY AREA
+def filterIndexed(columns, index, blockList, layout, jobCols=None, digits=TRACTDIGITS):
+    """Same rows as readLodes, but looked up through a sorted geocode index instead
+    of a scan. columns must be sorted by index['sortedBy'], and index['secondary'] maps
+    any other geocode column to (its values in ascending order, the row order that
+    sorts it). Only the slices of each column that match the study area are read.
+    Rows come back in primary sort order rather than file order."""
+    jobCols = selectJobCols(layout, jobCols)
+    return takeRows(columns, indexedRows(columns, index, blockList, digits), layout, jobCols)
+
+# CREATE FUNCTION TO FIND THE ROWS OF SORTED LODES COLUMNS THAT TOUCH THE STUDY AREA
+def indexedRows(columns, index, blockList, digits=TRACTDIGITS):
+    """Returns the sorted row positions filterIndexed would keep, without reading
+    any job columns."""
+    blocks = buildBlockIndex(blockList)
+    rows = [matchSorted(columns[index['sortedBy']], blocks, digits)]
+    for sortedValues, order in index['secondary'].values():
+        rows.append(np.asarray(order[matchSorted(sortedValues, blocks, digits)], dtype='int64'))
+    return np.unique(np.concatenate(rows)) #a row with home and work both in the study area is found twice
+
+# CREATE FUNCTION TO READ ROWS OF LODES COLUMNS INTO A DATAFRAME
+def takeRows(columns, rows, layout, jobCols):
+    """Returns the geocode columns and jobCols at the given row positions."""
+    geoCols = LAYOUTS[layout][0]
+    return pd.DataFrame({col: np.asarray(columns[col][rows]) for col in geoCols + list(jobCols)})
+
+# CREATE FUNCTION TO LIST THE JOB COLUMNS IN A DATAFRAME
+def jobColumns(frame):
+    """Returns the columns of a readLodes dataframe that are not geocodes."""
+    return [col for col in frame.columns if col not in KEYFIELDS]
+
+# CREATE FUNCTION TO FORMAT NUMERIC GEOCODES AS CENSUS BLOCK GEOID TEXT
+def geocodeText(geocodes):
+    """Returns a numpy array of zero-padded 15 character GEOID strings for an array of int geocodes."""
+    geocodes = np.asarray(geocodes, dtype='int64')
+    if len(geocodes) == 0:
+        return np.empty(0, dtype='U%d' % GEOIDLEN)
+    return np.char.zfill(geocodes.astype('U%d' % GEOIDLEN), GEOIDLEN)
+
+# CREATE FUNCTION TO SUM AND GROUP BY, SAME LAYOUT AS arcpy.analysis.Statistics
+def groupSum(frame, key, sumCols=None):
+    """Sums sumCols grouped by the key geocode in one reduction. Returns a dataframe
+    with the text key field from KEYFIELDS, FREQUENCY (row count) and a SUM_<col> field
+    per column, matching the stat tables arcpy.analysis.Statistics used to produce.
+    sumCols of None sums every job column in the frame."""
+    if sumCols is None:
+        sumCols = jobColumns(frame)
+    grouped = frame.groupby(key, sort=True)
+    totals = grouped[list(sumCols)].sum()
+    table = pd.DataFrame({KEYFIELDS[key]: geocodeText(totals.index.to_numpy())})
+    table['FREQUENCY'] = grouped.size().to_numpy()
+    for col in sumCols:
+        table['SUM_' + col] = totals[col].to_numpy()
+    return table
+
+# CREATE FUNCTION TO SPLIT OD ROWS INTO FLOW CATEGORIES AND SUM THEM
+def classifyOD(od, blockList, sumCols=None):
+    """Splits an OD dataframe into the FLOWCATEGORIES partitions and builds the five
+    FLOWSUMS stat tables in one pass. The home and work membership masks are computed
+    once and reused for every category. sumCols of None sums every job column read.
+    Returns (parts, statTables), two dicts keyed by category name and stat table name.
+    Each stat table is laid out as described in groupSum."""
+
+    parts = splitOD(od, blockList)
+    if sumCols is None:
+        sumCols = jobColumns(od)
+    statTables = {}
+    for name, (category, key) in FLOWSUMS.items():
+        statTables[name] = groupSum(parts[category], key, sumCols)
+    return parts, statTables
+
+# CREATE FUNCTION TO SPLIT OD ROWS INTO FLOW CATEGORIES
+def splitOD(od, blockList):
+    """Returns a dict of FLOWCATEGORIES name to the OD rows in that category, the
+    partition step of classifyOD without the sums."""
+    blocks = buildBlockIndex(blockList)
+    homeIn = inBlocks(od['h_geocode'].to_numpy(), blocks)
+    workIn = inBlocks(od['w_geocode'].to_numpy(), blocks)
+
+    parts = {}
+    for name, (home, work) in FLOWCATEGORIES.items():
+        mask = homeIn if home else ~homeIn
+        if work is not None:
+            mask = mask & (workIn if work else ~workIn)
+        parts[name] = od[mask]
+    return parts
+
+# CREATE FUNCTION TO FIND THE KEY FIELD OF A STAT TABLE
+def statKeyField(table):
+    """Returns the name of the GEOID text key field (one of KEYFIELDS) of a stat table."""
+    return [col for col in table.columns if col in KEYFIELDS.values()][0]
+
+# CREATE FUNCTION TO GET THE STAT TABLE ROWS FOR AN OUTPUT LAYER
+def outputTable(statTables, name, blockList):
+    """Returns the stat table rows for one of the OUTPUTLAYERS, split to the blocks
+    inside or outside the study area where the layer calls for it."""
+    tableName, side = OUTPUTLAYERS[name]
+    table = statTables[tableName]
+    if side is None:
+        return table
+    keyField = statKeyField(table)
+    inside = inBlocks(table[keyField].to_numpy().astype('int64'), buildBlockIndex(blockList))
+    return table[inside if side == 'inside' else ~inside]
+
+# CREATE FUNCTION TO SUM A RAC OR WAC FILE BY BLOCK
+def summarizeArea(frame, sumCols=None):
+    """Builds the stat table for a RAC or WAC dataframe from readLodes, grouped by
+    its single geocode column. Same layout as the OD stat tables."""
+    key = 'h_geocode' if 'h_geocode' in frame.columns else 'w_geocode'
+    return groupSum(frame, key, sumCols)
+
+# CREATE FUNCTION TO CONVERT A STAT TABLE FOR arcpy.da.NumPyArrayToTable
+def statTableToArray(table):
+    """Returns a numpy structured array of a stat table, text fields as fixed width
+    unicode and counts as int32 so the geodatabase table gets TEXT and LONG fields."""
+    dtype = []
+    for col in table.columns:
+        if col in KEYFIELDS.values():
+            dtype.append((col, 'U%d' % GEOIDLEN))
+        else:
+            dtype.append((col, 'i4'))
+    array = np.empty(len(table), dtype=dtype)
+    for col in table.columns:
+        array[col] = table[col].to_numpy()
+    return array
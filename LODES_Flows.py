@@ -0,0 +1,249 @@
+###############################################
+# Title: LODES Flows
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Origin-destination flow matrices above the census block level, like OnTheMap's Destination and
+# Distance/Direction reports. Block GEOIDs are cut down to the block group, tract, county or state they sit in
+# (or looked up in a census Block Assignment File for places), the study area's inflow or outflow is summed
+# into a sparse home area x work area matrix, and top-N and distance band questions are answered from the
+# matrix without going back to the LODES rows. The home and work sides can be at different levels, e.g.
+# tract-to-county flows. numpy only, no arcpy.
+# Matrix layout (dict from flowMatrix):
+#   homeLevel, workLevel     geographic level the home (origin) and work (destination) areas are at
+#   origins, destinations    sorted int64 area codes of the home (rows) and work (columns) areas
+#   row, col                 home and work area position of every non-zero cell, sorted by row then col (COO)
+#   indptr                   cells of row i are indptr[i]:indptr[i+1] (CSR)
+#   FREQUENCY, SUM_<col>     LODES row count and job sums of every cell
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import numpy as np
+import pandas as pd
+import LODES_Core
+
+# GEOGRAPHIC LEVELS, number of leading GEOID digits, place is not a GEOID prefix and needs a block assignment file
+LEVELS = {
+    'block': LODES_Core.GEOIDLEN,
+    'blockGroup': 12, #tract + block group (1)
+    'tract': LODES_Core.TRACTDIGITS,
+    'county': LODES_Core.COUNTYDIGITS,
+    'state': 2,
+    'place': None,
+}
+PLACEDIGITS = 7 #state (2) + place FIPS (5)
+NOPLACE = -1 #area code of blocks outside any incorporated place or CDP
+NOPLACELABEL = 'No place' #area text of NOPLACE in the flow tables
+
+# FLOW DIRECTIONS, the classifyOD categories that make up each direction
+FLOWDIRECTIONS = {
+    'outflow': ('liveIn',), #study area residents and where they work, including inside the study area
+    'inflow': ('liveInWorkIn', 'liveOutWorkIn'), #study area workers and where they live
+}
+
+# DISTANCE BANDS in miles, the same breaks OnTheMap's Distance/Direction report uses
+DISTANCEBANDS = [0, 10, 25, 50, np.inf]
+EARTHRADIUSMILES = 3958.8
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO READ A CENSUS BLOCK ASSIGNMENT FILE
+def readBlockAssignment(path, codeField='PLACEFP'):
+    """Reads a census Block Assignment File (pipe delimited BLOCKID|PLACEFP) and returns
+    a crosswalk (block GEOIDs sorted, area codes) for areaCodes. Place codes are the 7
+    digit place GEOID, blocks with no place get NOPLACE."""
+    baf = pd.read_csv(path, sep='|', dtype={'BLOCKID': 'int64', codeField: 'str'})
+    geoids = baf['BLOCKID'].to_numpy()
+    codes = pd.to_numeric(baf[codeField], errors='coerce').to_numpy()
+    codes = np.where(np.isnan(codes), NOPLACE, geoids // 10 ** (LODES_Core.GEOIDLEN - 2) * 10 ** 5 + np.nan_to_num(codes))
+    order = np.argsort(geoids, kind='stable')
+    return geoids[order], codes[order].astype('int64')
+
+# CREATE FUNCTION TO GET THE AREA EACH BLOCK IS IN
+def areaCodes(geocodes, level, crosswalk=None):
+    """Returns the int64 area code of every block GEOID at level, the GEOID cut down to
+    its leading LEVELS[level] digits in one integer divide. place looks each block up in
+    crosswalk (from readBlockAssignment), NOPLACE where it is not found."""
+    geocodes = np.asarray(geocodes, dtype='int64')
+    if level not in LEVELS:
+        raise ValueError("%s is not a geographic level, use one of %s" % (level, ', '.join(LEVELS)))
+    digits = LEVELS[level]
+    if digits is not None:
+        return geocodes // 10 ** (LODES_Core.GEOIDLEN - digits)
+    if crosswalk is None:
+        raise ValueError("place level flows need a block assignment file")
+    blocks, codes = crosswalk
+    if len(blocks) == 0:
+        return np.full(len(geocodes), NOPLACE, dtype='int64')
+    pos = np.searchsorted(blocks, geocodes)
+    pos[pos == len(blocks)] = 0
+    return np.where(blocks[pos] == geocodes, codes[pos], NOPLACE)
+
+# CREATE FUNCTION TO FORMAT AREA CODES AS GEOID TEXT
+def areaText(codes, level):
+    """Returns zero-padded GEOID text for area codes at level, e.g. 5 characters for
+    counties. NOPLACE comes back as NOPLACELABEL."""
+    width = PLACEDIGITS if LEVELS[level] is None else LEVELS[level]
+    codes = np.asarray(codes, dtype='int64')
+    if len(codes) == 0:
+        return np.empty(0, dtype='U%d' % width)
+    return np.where(codes == NOPLACE, NOPLACELABEL, np.char.zfill(codes.astype('U%d' % width), width))
+
+# CREATE FUNCTION TO BUILD A SPARSE OD FLOW MATRIX
+def flowMatrix(od, homeLevel, sumCols=None, crosswalk=None, workLevel=None):
+    """Sums OD rows into a sparse home area x work area matrix, home blocks cut down to
+    homeLevel and work blocks to workLevel (homeLevel if None), see the layout at the
+    top of this file. Each row's pair of area codes is packed into one key and summed
+    with one sort, so memory follows the number of distinct area pairs. sumCols of
+    None sums every job column in od."""
+    if sumCols is None:
+        sumCols = LODES_Core.jobColumns(od)
+    workLevel = workLevel or homeLevel
+    home = areaCodes(od['h_geocode'].to_numpy(), homeLevel, crosswalk)
+    work = areaCodes(od['w_geocode'].to_numpy(), workLevel, crosswalk)
+    origins, homeIdx = np.unique(home, return_inverse=True)
+    destinations, workIdx = np.unique(work, return_inverse=True)
+
+    pairs, cellIdx = np.unique(homeIdx.astype('int64') * len(destinations) + workIdx, return_inverse=True)
+    matrix = {
+        'homeLevel': homeLevel,
+        'workLevel': workLevel,
+        'origins': origins,
+        'destinations': destinations,
+        'row': pairs // max(len(destinations), 1),
+        'col': pairs % max(len(destinations), 1),
+        'FREQUENCY': np.bincount(cellIdx, minlength=len(pairs)).astype('int64'),
+    }
+    matrix['indptr'] = np.searchsorted(matrix['row'], np.arange(len(origins) + 1))
+    for col in sumCols:
+        matrix['SUM_' + col] = np.bincount(cellIdx, weights=od[col].to_numpy(), minlength=len(pairs)).astype('int64')
+    return matrix
+
+# CREATE FUNCTION TO BUILD THE STUDY AREA'S INFLOW AND OUTFLOW MATRICES
+def studyAreaFlows(parts, homeLevel, sumCols=None, crosswalk=None, workLevel=None):
+    """Takes the parts dict from LODES_Core.classifyOD and returns {'outflow': matrix,
+    'inflow': matrix}, one flowMatrix per FLOWDIRECTIONS entry."""
+    flows = {}
+    for direction, categories in FLOWDIRECTIONS.items():
+        od = pd.concat([parts[category] for category in categories], ignore_index=True)
+        flows[direction] = flowMatrix(od, homeLevel, sumCols, crosswalk, workLevel)
+    return flows
+
+# CREATE FUNCTION TO LIST THE SUM FIELDS OF A MATRIX
+def sumFields(matrix):
+    return [key for key in matrix if key.startswith('SUM_')]
+
+# CREATE FUNCTION TO GET ONE ORIGIN'S ROW OF THE MATRIX
+def flowsFrom(matrix, area):
+    """Returns a dataframe of the work areas that home area sends workers to, read
+    straight from the CSR row. Empty if the area is not an origin."""
+    i = np.searchsorted(matrix['origins'], area)
+    if i == len(matrix['origins']) or matrix['origins'][i] != area:
+        start = stop = 0
+    else:
+        start, stop = matrix['indptr'][i], matrix['indptr'][i + 1]
+    table = pd.DataFrame({'w_area': areaText(matrix['destinations'][matrix['col'][start:stop]], matrix['workLevel'])})
+    for field in ['FREQUENCY'] + sumFields(matrix):
+        table[field] = matrix[field][start:stop]
+    return table
+
+# CREATE FUNCTION TO CONVERT A MATRIX TO A TABLE
+def matrixTable(matrix):
+    """Returns the non-zero cells of a matrix as a dataframe with h_area and w_area
+    GEOID text, FREQUENCY and the SUM_ fields, one row per home area/work area pair."""
+    table = pd.DataFrame({'h_area': areaText(matrix['origins'][matrix['row']], matrix['homeLevel']),
+                          'w_area': areaText(matrix['destinations'][matrix['col']], matrix['workLevel'])})
+    for field in ['FREQUENCY'] + sumFields(matrix):
+        table[field] = matrix[field]
+    return table
+
+# CREATE FUNCTION TO FIND THE TOP AREAS OF A MATRIX
+def topAreas(matrix, n=10, by='w_area', field='SUM_S000'):
+    """Returns the n areas with the most field, summed over the other side of the
+    matrix. by='w_area' gives top destinations (use with an outflow matrix), by='h_area'
+    top origins (inflow). Columns are the area, its total and its share of all flows.
+    Blocks in no place are not an area, so NOPLACE is never listed, but its flows still
+    count toward the shares."""
+    if by == 'w_area':
+        areas, idx, level = matrix['destinations'], matrix['col'], matrix['workLevel']
+    else:
+        areas, idx, level = matrix['origins'], matrix['row'], matrix['homeLevel']
+    totals = np.bincount(idx, weights=matrix[field], minlength=len(areas)).astype('int64')
+    grand = totals.sum()
+    top = np.argsort(-totals, kind='stable')
+    top = top[areas[top] != NOPLACE][:n]
+    return pd.DataFrame({by: areaText(areas[top], level), field: totals[top],
+                         'share': totals[top] / grand if grand else np.zeros(len(top))})
+
+# CREATE FUNCTION TO GET THE CENTROID OF EVERY AREA
+def areaCentroids(blockTable, level, crosswalk=None):
+    """Returns (codes, x, y), sorted area codes at level and the mean centroid of their
+    blocks, from a block table (LODES_BlockIndex.BLOCKDTYPE, e.g. the block store's).
+    Blocks in no place have no centroid, so their flows fall in distanceBands' 'Unknown'
+    rather than being measured from the middle of every unincorporated block."""
+    allCodes = areaCodes(blockTable['geoid'], level, crosswalk)
+    inArea = allCodes != NOPLACE
+    codes, idx = np.unique(allCodes[inArea], return_inverse=True)
+    counts = np.bincount(idx, minlength=len(codes))
+    x = np.bincount(idx, weights=np.asarray(blockTable['x'])[inArea], minlength=len(codes)) / counts
+    y = np.bincount(idx, weights=np.asarray(blockTable['y'])[inArea], minlength=len(codes)) / counts
+    return codes, x, y
+
+# CREATE FUNCTION TO MEASURE THE DISTANCE OF EVERY FLOW
+def flowDistances(matrix, centroids, geographic=True, unitsToMiles=1.0, workCentroids=None):
+    """Returns the home to work centroid distance in miles of every matrix cell, NaN
+    where either area has no centroid. centroids are the home areas' (from areaCentroids
+    at the matrix's homeLevel), workCentroids the work areas' if the work side is at
+    another level. geographic centroids are longitude/latitude and use the great circle
+    distance, otherwise straight line distance times unitsToMiles."""
+
+    def locate(areas, centroids):
+        codes, x, y = centroids
+        pos = np.searchsorted(codes, areas)
+        pos[pos == len(codes)] = 0
+        found = (codes[pos] == areas) if len(codes) else np.zeros(len(areas), dtype=bool)
+        return np.where(found, x[pos], np.nan), np.where(found, y[pos], np.nan)
+
+    hx, hy = locate(matrix['origins'][matrix['row']], centroids)
+    wx, wy = locate(matrix['destinations'][matrix['col']], centroids if workCentroids is None else workCentroids)
+    if not geographic:
+        return np.hypot(wx - hx, wy - hy) * unitsToMiles
+    hx, hy, wx, wy = map(np.radians, (hx, hy, wx, wy))
+    a = np.sin((wy - hy) / 2) ** 2 + np.cos(hy) * np.cos(wy) * np.sin((wx - hx) / 2) ** 2
+    return 2 * EARTHRADIUSMILES * np.arcsin(np.sqrt(a))
+
+# CREATE FUNCTION TO SUM A MATRIX INTO DISTANCE BANDS
+def distanceBands(matrix, centroids, bands=DISTANCEBANDS, geographic=True, unitsToMiles=1.0, workCentroids=None):
+    """Returns a dataframe with one row per distance band (plus 'Unknown' for areas with
+    no centroid) and the FREQUENCY and SUM_ fields of the flows falling in it. At block
+    level this matches OnTheMap's distance report, above it distances are between area
+    centroids, so flows inside one area count as 0 miles. workCentroids as in flowDistances."""
+    distance = flowDistances(matrix, centroids, geographic, unitsToMiles, workCentroids)
+    labels = ['%g to %g miles' % (lo, hi) if np.isfinite(hi) else 'Greater than %g miles' % lo
+              for lo, hi in zip(bands[:-1], bands[1:])] + ['Unknown']
+    band = np.where(np.isnan(distance), len(bands) - 1,
+                    np.clip(np.searchsorted(bands, np.nan_to_num(distance), 'right') - 1, 0, len(bands) - 2))
+    table = pd.DataFrame({'band': labels})
+    for field in ['FREQUENCY'] + sumFields(matrix):
+        table[field] = np.bincount(band, weights=matrix[field], minlength=len(labels)).astype('int64')
+    return table
+
+# CREATE FUNCTION TO CONVERT A FLOW TABLE FOR arcpy.da.NumPyArrayToTable
+def flowTableToArray(table):
+    """Returns a numpy structured array of a flow table, text columns as fixed width
+    unicode, counts as int32 and shares as doubles."""
+    dtype = []
+    for col in table.columns:
+        values = table[col].to_numpy()
+        if values.dtype.kind in 'OUS':
+            dtype.append((col, 'U%d' % max(1, max((len(str(v)) for v in values), default=1))))
+        elif values.dtype.kind == 'f':
+            dtype.append((col, 'f8'))
+        else:
+            dtype.append((col, 'i4'))
+    array = np.empty(len(table), dtype=dtype)
+    for col in table.columns:
+        array[col] = table[col].to_numpy()
+    return array
@@ -0,0 +1,152 @@
+###############################################
+# Title: LODES Incremental
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Incremental reruns of LODES_Script_Tool.py. Each run saves its study area blocks, the cache rows
+# it used and its stat tables to a state folder. When the next run is against the same LODES file, job columns
+# and geodatabase, only the blocks that moved in or out of the study area are looked up in the cache, only the
+# stat table rows keyed on a block touched by those moves are summed again, and only those output features are
+# replaced. No arcpy, the feature updates are in LODES_Blocks.updateJoinedOutputs and the output fingerprint
+# (feature count and highest ObjectID of each output, so an output edited or rewritten since is noticed) comes from
+# LODES_Blocks.outputFingerprint.
+# State layout:
+#   <stateDir>/meta.json         LODES cache key, job columns, output geodatabase, output fingerprint, version
+#   <stateDir>/blocks.npy        sorted study area block GEOIDs
+#   <stateDir>/rows.npy          cache row positions of the OD rows touching the study area
+#   <stateDir>/statTable<N>.npy  stat tables as written, see LODES_Core.statTableToArray
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import LODES_Core
+import LODES_Cache
+
+# STATE SETTINGS
+STATEVERSION = 2 #bump when the state layout changes, older state is ignored
+MAXCHANGE = 0.25 #do a full run instead once more than this share of the study area's blocks moved
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO SAVE A RUN FOR THE NEXT INCREMENTAL RUN
+def saveState(stateDir, lodesKey, jobCols, outGDB, blockList, rows, statTables, fingerprint=None):
+    """Writes the study area blocks, cache rows and stat tables of a finished run to
+    stateDir. lodesKey is LODES_Cache.cacheKey of the LODES file, fingerprint a dict of
+    output name to [feature count, highest ObjectID] taken after the outputs were
+    written. meta.json is written last, so a run stopped part way leaves state
+    loadState won't use."""
+    os.makedirs(stateDir, exist_ok=True)
+    metaFile = os.path.join(stateDir, 'meta.json')
+    if os.path.exists(metaFile):
+        os.remove(metaFile)
+    np.save(os.path.join(stateDir, 'blocks.npy'), LODES_Core.buildBlockIndex(blockList))
+    np.save(os.path.join(stateDir, 'rows.npy'), np.asarray(rows, dtype='int64'))
+    for name, table in statTables.items():
+        np.save(os.path.join(stateDir, name + '.npy'), LODES_Core.statTableToArray(table))
+    meta = {'version': STATEVERSION, 'lodes': lodesKey, 'jobCols': list(jobCols), 'outGDB': outGDB,
+            'statTables': list(statTables), 'fingerprint': fingerprint, 'saved': time.time()}
+    LODES_Cache.writeAtomic(metaFile, json.dumps(meta, indent=2))
+
+# CREATE FUNCTION TO LOAD THE PREVIOUS RUN
+def loadState(stateDir, lodesKey, jobCols, outGDB, fingerprint=None):
+    """Returns the saved state as a dict (blocks, rows, statTables), or None if there is
+    none, it was for a different LODES file, job columns or output geodatabase, or the
+    outputs no longer match the fingerprint saved with it."""
+    metaFile = os.path.join(stateDir, 'meta.json')
+    if not os.path.exists(metaFile):
+        return None
+    with open(metaFile) as f:
+        meta = json.load(f)
+    if (meta.get('version') != STATEVERSION or meta['lodes'] != lodesKey
+            or meta['jobCols'] != list(jobCols) or os.path.normcase(meta['outGDB']) != os.path.normcase(outGDB)
+            or meta.get('fingerprint') != fingerprint):
+        return None
+
+    statTables = {}
+    for name in meta['statTables']:
+        table = pd.DataFrame(np.load(os.path.join(stateDir, name + '.npy')))
+        table['FREQUENCY'] = table['FREQUENCY'].astype('int64') #same dtypes as groupSum gives, the sums stay int32
+        statTables[name] = table
+    return {'blocks': np.load(os.path.join(stateDir, 'blocks.npy')),
+            'rows': np.load(os.path.join(stateDir, 'rows.npy')),
+            'statTables': statTables}
+
+# CREATE FUNCTION TO COMPARE TWO STUDY AREAS
+def diffBlocks(oldBlocks, newBlocks):
+    """Returns (added, removed), the sorted block GEOIDs only in the new or only in the
+    old study area."""
+    oldBlocks = LODES_Core.buildBlockIndex(oldBlocks)
+    newBlocks = LODES_Core.buildBlockIndex(newBlocks)
+    return np.setdiff1d(newBlocks, oldBlocks), np.setdiff1d(oldBlocks, newBlocks)
+
+# CREATE FUNCTION TO REPLACE THE STAT TABLE ROWS OF SOME KEYS
+def replaceKeys(table, partial, keyField, keys):
+    """Returns table with the rows keyed on keys swapped for partial's rows keyed on
+    keys, still sorted by key."""
+    oldIn = LODES_Core.inBlocks(table[keyField].to_numpy().astype('int64'), keys)
+    newIn = LODES_Core.inBlocks(partial[keyField].to_numpy().astype('int64'), keys)
+    merged = pd.concat([table[~oldIn], partial[newIn]], ignore_index=True)
+    return merged.sort_values(keyField, kind='stable', ignore_index=True)
+
+# CREATE FUNCTION TO UPDATE THE PREVIOUS RUN FOR A NEW STUDY AREA
+def updateRun(columns, index, state, blockList, jobCols=None, maxChange=MAXCHANGE):
+    """Brings a saved OD run up to date with a new study area block list. Returns a dict
+    with rows (cache row positions), od, parts and statTables, the same as a full run
+    would give, plus changedKeys, stat table name to the sorted GEOIDs whose rows were
+    summed again. Returns None if more than maxChange of the blocks moved.
+
+    Only rows with an end on a moved block can change flow category, so only the stat
+    table keys of those rows are summed again, from every row that has that key."""
+    blocks = LODES_Core.buildBlockIndex(blockList)
+    jobCols = LODES_Core.selectJobCols('od', jobCols)
+    added, removed = diffBlocks(state['blocks'], blocks)
+    moved = np.union1d(added, removed)
+    if len(moved) > maxChange * max(len(blocks), 1):
+        return None
+
+    # old rows that still touch the study area, plus the rows of the blocks that came in
+    geoCols = LODES_Core.ODGEOCOLS
+    oldRows = state['rows']
+    oldGeo = {col: np.asarray(columns[col][oldRows]) for col in geoCols}
+    keep = LODES_Core.touchesBlocks(oldGeo, geoCols, blocks)
+    rows = np.union1d(oldRows[keep], LODES_Core.indexedRows(columns, index, added))
+
+    # geocodes of every old or new row with an end on a moved block, these are the stat table keys to sum again
+    touched = np.union1d(oldRows, rows)
+    touchedGeo = {col: np.asarray(columns[col][touched]) for col in geoCols}
+    hit = LODES_Core.touchesBlocks(touchedGeo, geoCols, moved)
+    affected = {col: np.unique(touchedGeo[col][hit]) for col in geoCols}
+
+    od = LODES_Core.takeRows(columns, rows, 'od', jobCols)
+    sub = od[LODES_Core.inBlocks(od['w_geocode'].to_numpy(), affected['w_geocode'])
+             | LODES_Core.inBlocks(od['h_geocode'].to_numpy(), affected['h_geocode'])]
+    partTables = LODES_Core.classifyOD(sub, blocks, jobCols)[1]
+
+    statTables = {}
+    changedKeys = {}
+    for name, (category, key) in LODES_Core.FLOWSUMS.items():
+        statTables[name] = replaceKeys(state['statTables'][name], partTables[name], LODES_Core.KEYFIELDS[key], affected[key])
+        changedKeys[name] = affected[key]
+    return {'rows': rows, 'od': od, 'parts': LODES_Core.splitOD(od, blocks), 'statTables': statTables,
+            'changedKeys': changedKeys, 'added': added, 'removed': removed}
+
+# CREATE FUNCTION TO LIST THE OUTPUT FEATURES TO REPLACE
+def outputChanges(statTables, changedKeys, blockList):
+    """Returns {output name: (stat table name, GEOIDs to delete, stat table rows to
+    insert)} for every LODES_Core.OUTPUTLAYERS output, for LODES_Blocks.updateJoinedOutputs.
+    The GEOIDs are every changed key of the output's stat table, the rows are the ones
+    of those keys that belong in the output now."""
+    changes = {}
+    for outName, (tableName, side) in LODES_Core.OUTPUTLAYERS.items():
+        keys = changedKeys[tableName]
+        table = LODES_Core.outputTable(statTables, outName, blockList)
+        keyField = LODES_Core.statKeyField(table)
+        insert = table[LODES_Core.inBlocks(table[keyField].to_numpy().astype('int64'), keys)]
+        changes[outName] = (tableName, LODES_Core.geocodeText(keys), insert)
+    return changes
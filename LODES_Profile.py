@@ -0,0 +1,194 @@
+###############################################
+# Title: LODES Profile
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Stage timing for LODES_Script_Tool.py. Each numbered step of the tool is wrapped in
+# beginStage/endStage, which record wall time, CPU time, memory and rows in/out, pass progress to the
+# tool's messages, and at the end write everything to a JSON run report (and optionally a cProfile dump)
+# so runs can be compared across releases. No arcpy, messages go through the functions handed to startRun.
+# Memory per stage: processPeakRssMB is the peak of the whole process so far (it never goes down, so later stages
+# carry earlier peaks), stagePeakDeltaMB is how far memory rose above where it was when the stage started.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO READ THE MEMORY COUNTERS OF THIS PROCESS ON WINDOWS
+def windowsMemoryCounters():
+    """Returns the PROCESS_MEMORY_COUNTERS of this process, None if the call fails."""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+# CREATE FUNCTION TO READ A LINE OF /proc/self/status ON LINUX
+def procStatusMB(name):
+    """Returns the /proc/self/status value name (e.g. VmRSS) in MB, None if there is none."""
+    if not os.path.exists('/proc/self/status'):
+        return None
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(name + ':'):
+                return int(line.split()[1]) / 1024
+    return None
+
+# CREATE FUNCTION TO GET THE PEAK MEMORY OF THIS PROCESS
+def peakRssMB():
+    """Returns the peak resident set size of this process so far in MB, None if the
+    platform doesn't say."""
+    if sys.platform == 'win32':
+        counters = windowsMemoryCounters()
+        return counters.PeakWorkingSetSize / 1024 ** 2 if counters else None
+    peak = procStatusMB('VmHWM') #Linux, VmHWM starts over in a new process, ru_maxrss carries the parent's peak
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024 #bytes on macOS, KB on Linux
+
+# CREATE FUNCTION TO GET THE CURRENT MEMORY OF THIS PROCESS
+def currentRssMB():
+    """Returns the resident set size of this process now in MB, None if the platform
+    doesn't say."""
+    if sys.platform == 'win32':
+        counters = windowsMemoryCounters()
+        return counters.WorkingSetSize / 1024 ** 2 if counters else None
+    return procStatusMB('VmRSS')
+
+# CREATE FUNCTION TO START RECORDING A RUN
+def startRun(reportPath=None, profilePath=None, message=print, progress=None, **details):
+    """Returns a run dict to pass to beginStage/endStage/finishRun. reportPath is where
+    finishRun writes the JSON report (None skips it), profilePath turns on cProfile
+    for the whole run and is where the stats are dumped. message(text) gets a line per
+    stage, progress(label) is called as each stage starts (e.g. arcpy.SetProgressor).
+    Any keyword details (input file, study area...) are copied into the report."""
+    run = {
+        'reportPath': reportPath,
+        'profilePath': profilePath,
+        'message': message,
+        'progress': progress,
+        'profiler': None,
+        'current': None,
+        'report': {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'details': details,
+            'stages': [],
+        },
+        'wall0': time.perf_counter(),
+        'cpu0': time.process_time(),
+    }
+    if profilePath:
+        run['profiler'] = cProfile.Profile()
+        run['profiler'].enable()
+    return run
+
+# CREATE FUNCTION TO START TIMING A STAGE
+def beginStage(run, name, rowsIn=None):
+    """Starts timing stage name, ending the previous stage first if it is still open."""
+    if run['current'] is not None:
+        endStage(run)
+    run['current'] = {'stage': name, 'rowsIn': rowsIn, 'rowsOut': None,
+                      'wall0': time.perf_counter(), 'cpu0': time.process_time(),
+                      'rss0': currentRssMB(), 'peak0': peakRssMB()}
+    if run['progress']:
+        run['progress'](name)
+
+# CREATE FUNCTION TO STOP TIMING A STAGE
+def endStage(run, rowsOut=None, rowsIn=None):
+    """Records the open stage's wall and CPU seconds, memory and row counts, and sends
+    a one line summary to run['message']. rowsIn replaces the count given to beginStage,
+    for stages that only know how many rows they read once they are done."""
+    current = run['current']
+    if current is None:
+        return
+    run['current'] = None
+    record = {
+        'stage': current['stage'],
+        'wallSeconds': round(time.perf_counter() - current['wall0'], 3),
+        'cpuSeconds': round(time.process_time() - current['cpu0'], 3),
+        'processPeakRssMB': peakRssMB(),
+        'stagePeakDeltaMB': stagePeakDelta(current),
+        'rowsIn': current['rowsIn'] if rowsIn is None else rowsIn,
+        'rowsOut': rowsOut,
+    }
+    run['report']['stages'].append(record)
+
+    text = "%s: %.1fs wall, %.1fs CPU" % (record['stage'], record['wallSeconds'], record['cpuSeconds'])
+    if record['stagePeakDeltaMB'] is not None:
+        text += ", memory +%.0f MB" % record['stagePeakDeltaMB']
+    if record['processPeakRssMB'] is not None:
+        text += ", process peak %.0f MB" % record['processPeakRssMB']
+    if record['rowsIn'] is not None or record['rowsOut'] is not None:
+        text += ", rows %s -> %s" % (record['rowsIn'], record['rowsOut'])
+    run['message'](text)
+
+# CREATE FUNCTION TO WORK OUT HOW FAR MEMORY ROSE DURING A STAGE
+def stagePeakDelta(current):
+    """Returns the stage's peak memory less the memory at its start, in MB. The process
+    peak can't be reset, so when the stage set a new one that is its peak, otherwise its
+    peak was under the earlier one and the memory at its end is used, a lower bound.
+    None if the platform doesn't say."""
+    peak = peakRssMB()
+    now = currentRssMB()
+    if current['rss0'] is None or peak is None or now is None:
+        return None
+    stagePeak = peak if peak > current['peak0'] else now
+    return round(max(stagePeak - current['rss0'], 0), 1)
+
+# CREATE FUNCTION TO FINISH A RUN AND WRITE THE REPORT
+def finishRun(run):
+    """Ends any open stage, adds run totals, writes the JSON report and the cProfile
+    dump if they were asked for, and returns the report dict."""
+    endStage(run)
+    report = run['report']
+    report['wallSeconds'] = round(time.perf_counter() - run['wall0'], 3)
+    report['cpuSeconds'] = round(time.process_time() - run['cpu0'], 3)
+    report['processPeakRssMB'] = peakRssMB()
+
+    if run['profiler'] is not None:
+        run['profiler'].disable()
+        makeFolder(run['profilePath'])
+        run['profiler'].dump_stats(run['profilePath'])
+        report['profile'] = run['profilePath']
+    if run['reportPath']:
+        makeFolder(run['reportPath'])
+        with open(run['reportPath'], 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    return report
+
+# CREATE FUNCTION TO MAKE THE FOLDER A FILE WILL BE WRITTEN TO
+def makeFolder(path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
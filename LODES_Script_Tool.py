@@ -7,9 +7,9 @@
 # 2 Get user input study area and check for polygon
 # 3 Add census data to map
 # 4 Extract list of census blocks within study area by geoid
-# 5 EXTRACT DATA FROM LODES.CSV, FILTER BY STUDY AREA LIST, CREATE REQUIRED DBFS
+# 5 EXTRACT DATA FROM LODES.CSV, FILTER BY STUDY AREA LIST
 # 6 From extracted LODES data, sum and group by on work census block
-# 7 Join data to census block shapefile
+# 7 Join data to census block shapefile, outputs keep the census block fields
 # 8 ADD DATA AND SYMBOLIZE
 
 
@@ -22,403 +22,458 @@ from arcpy import management
 from arcpy import analysis
 import sys
 import os
-import pandas as pd
-
-# INITIAL SETUP
-aprx = arcpy.mp.ArcGISProject("CURRENT") #Set project to the currently open project where the tool is being run
-m = aprx.activeMap #Set map object to variable with activeMap method
-arcpy.env.overwriteOutput=True
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #LODES_*.py live next to this script
+import LODES_Core
+import LODES_Cache
+import LODES_Blocks
+import LODES_Profile
+import LODES_Flows
+import LODES_Incremental
+from LODES_ToolUtils import AddMsgAndPrint, getOptionalParameter, getJobCols, useEnvironmentPython
 
 # INPUT PATHS
-#dataPath = r'https://services2.arcgis.com/FiaPA4ga0iQKduv3/arcgis/rest/services/US_Census_Blocks_v1/FeatureServer' #If your study area is outside of Texas, use this path but be warned that its every census block in the US and takes considerable processing power. ALSO SEE LINE 131!!
+#dataPath = r'https://services2.arcgis.com/FiaPA4ga0iQKduv3/arcgis/rest/services/US_Census_Blocks_v1/FeatureServer' #If your study area is outside of Texas, use this path but be warned that its every census block in the US and takes considerable processing power. A local block store (LODES_Blocks.py) is much faster
 dataPath = r'https://services.arcgis.com/P3ePLMYs2RVChkJx/arcgis/rest/services/Texas_Census_2020_Redistricting_Blocks/FeatureServer' #path for living atlas layer
 
-#TEMP OUTPUTS
-tempout=arcpy.env.scratchGDB
-
-#PERMANENT OUTPUTS
-defaultGDB=aprx.defaultGeodatabase
-outcsv=os.path.join(defaultGDB, "outcsv.csv") #this is created outside a geoprocessing tool and will not default to the GDB
-#outcsv=r'C:\Users\cramos\OneDrive - City of Kyle\Documents\2024\August\LODES_Script_Tool\Data\outcsv.csv'
-outcsv2=os.path.join(defaultGDB, "outcsv2.csv")
-outcsv3=os.path.join(defaultGDB, "outcsv3.csv")
-outcsv4=os.path.join(defaultGDB, "outcsv4.csv")
-outcsv444=os.path.join(defaultGDB, "outcsv444.csv")
-
-#1 INPUT PARAMETERS
-inArea1=arcpy.GetParameterAsText(0) #required study area
-lodes=arcpy.GetParameterAsText(1) #requred lodes csv.gz data
-
-
-
-###############################################
-
-
 
 
 ##---------------------------------------------------------------------------------------------------
 # FUNCTIONS
-# CREATE FUNCTION TO ADD MESSAGES THROUGHOUT SCRIPT, taken from arcpy documentation
-def AddMsgAndPrint(msg, severity=0):
-    # Adds a Message (in case this is run as a tool)
-    # and also prints the message to the screen (standard output)
-    print(msg)
-
-    # Split the message on \n first, so that if its multiple lines,
-    # a GPMessage will be added for each line
-    try:
-        for string in msg.split('\n'):
-            # Add appropriate geoprocessing message
-            if severity == 0:
-                arcpy.AddMessage(string)
-            elif severity == 1:
-                arcpy.AddWarning(string)
-            elif severity == 2:
-                arcpy.AddError(string)
-    except:
-        pass
-
-#CREATE FUNCTION TO BUILD WHERE CLAUSE FROM LIST
-def buildWhereClauseFromList(table, field, valueList):
-    """Takes a list of values and constructs a SQL WHERE
-    clause to select those values within a given field and table."""
-
-    # Add DBMS-specific field delimiters
-    fieldDelimited = arcpy.AddFieldDelimiters(arcpy.Describe(table).path, field)
-
-    # Determine field type
-    fieldType = arcpy.ListFields(table, field)[0].type
-
-    # Add single-quotes for string field values
-    if str(fieldType) == 'String':
-        valueList = ["'%s'" % value for value in valueList]
-
-    # Format WHERE clause in the form of an IN statement
-    whereClause = "%s IN(%s)" % (fieldDelimited, ', '.join(map(str, valueList)))
-    return whereClause
-
-
-
-##---------------------------------------------------------------------------------------------------
-## 2 USER INPUT STUDY AREA
+#AddMsgAndPrint and getOptionalParameter are shared with the other LODES tools, see LODES_ToolUtils.py
 
-#check input for type polygon-stolen from arcpy documentation
-inArea1Desc=arcpy.Describe(inArea1)
-if inArea1Desc.shapeType != "Polygon" :
-    AddMsgAndPrint("Input Study Area must be of type polygon.", 2)
-    sys.exit()
 
 
 ##---------------------------------------------------------------------------------------------------
-## 3 ADD CENSUS DATA TO MAP
-
-# add the living atlas layer from path, with method on map object
-arcpy.SetProgressor("","Adding census blocks")
-m.addDataFromPath(dataPath)
-
-# get newly added layer as cenBlocks variable
-# Note, the layer imports as a group layer, and the sublayer needed is called 'Blocks', which is
-# generic and it seems inconsistent, somtimes called 'USA_BLOCK_GROUPS//Blocks, therefore, will
-# get the layer into a variable by counting the number of features for every layer in the map,
-# if is feature layer and if count==668757, it's the layer we want.
-for maplayer in m.listLayers():
-    if maplayer.isFeatureLayer:
-        if str(arcpy.management.GetCount(maplayer)) == '668757': #IF USING FULL U.S. CENSUS BLOCK SHAPEFILE, CHANGE THIS TO 8180866
-            cenBlocks = maplayer
-
-
-AddMsgAndPrint("Finished adding census blocks", 0)
-
-arcpy.AddMessage(arcpy.management.GetCount(cenBlocks))
-#arcpy.management.CopyFeatures(cenBlocksOnline,"cenBlocks")
-
-
-
-##---------------------------------------------------------------------------------------------------
-## 4 EXTRACT LIST OF HOME CENSUS BLOCKS IN STUDY AREA
-
-arcpy.SetProgressor("","Selecting by location")
-AddMsgAndPrint("Selecting by by location", 0)
-arcpy.management.SelectLayerByLocation(cenBlocks, 'INTERSECT', inArea1,"",'NEW_SELECTION')
-arcpy.AddMessage(arcpy.management.GetCount(cenBlocks))
-
-arcpy.SetProgressor("","Creating census block list")
-AddMsgAndPrint("Creating census block list", 0)
-blockList = []
-with arcpy.da.SearchCursor(cenBlocks, 'GEOID') as cur1:
-    for row in cur1:
-        blockList.append((int(cur1[0]))) #For some reason, GEOID returns a tuple with an empty second, need to use index 0 to get the id
-
-
-AddMsgAndPrint(len(blockList))
-
-
-
-
-
-##---------------------------------------------------------------------------------------------------
-## 5 EXTRACT DATA FROM LODES.CSV, FILTER BY STUDY AREA LIST, CREATE REQUIRED DBFS
-
-#Extract LODES csv to Pandas dataframe
-AddMsgAndPrint("Extracting LODES csv",0)
-df=pd.read_csv(lodes, compression='gzip')
-df4=df #to be used later
-
-
-#Extract where h_geo in SA for resident's work locations inside and outside SA, will split between inside outside later
-AddMsgAndPrint("Creating LODES dbf",0)
-df=df.query('h_geocode in @blockList') #filter the dataframe by home location corresponding to the list of census blocks in the study area
-arcpy.AddMessage(df.shape)
-df.to_csv(outcsv)
-outdbf=arcpy.conversion.ExportTable(outcsv,"outdbf")
-
-#Next extract where h_geo in SA, w_geo outside SA for home locations of residents who leave SA for work
-AddMsgAndPrint("Creating LODES2 dbf",0)
-df2=df.query('w_geocode not in @blockList')
-arcpy.AddMessage(df2.shape)
-df2.to_csv(outcsv2)
-outdbf2=arcpy.conversion.ExportTable(outcsv2,"outdbf2")
-
-#Next, extract where h_geo in SA, w_geo inside SA for home locations of residents who stay in SA for work
-AddMsgAndPrint("Creating LODES3 dbf",0)
-df3=df.query('w_geocode in @blockList')
-arcpy.AddMessage(df3.shape)
-df3.to_csv(outcsv3)
-outdbf3=arcpy.conversion.ExportTable(outcsv3,"outdbf3")
-
-#Finally, extract where w_geo is in SA but h_geo is not for home and work locations of non-residents traveling to the city for work
-arcpy.AddMessage(df4.shape)
-df4=df4.query('w_geocode in @blockList & h_geocode not in @blockList') #filter the dataframe by work location in city but home location outside of city
-arcpy.AddMessage(df4.shape)
-df4.to_csv(outcsv4)
-outdbf4=arcpy.conversion.ExportTable(outcsv4,"outdbf4")
-
-
-
-##---------------------------------------------------------------------------------------------------
-## 6 SUM S000 AND GROUP BY TO GET PEOPLE WORKING AND LIVING IN EACH RELATED CENSUS BLOCK
-#This works because the data is already filter accordingly from step #, this will show
-#how many of the target residents work and live in each census block
-
-#Sum and group by WORK geocode to get work locations for residents, will split by inside/outside SA in join below
-AddMsgAndPrint("Creating Sum and Group by Table1",0)
-arcpy.analysis.Statistics(outdbf, 'statTable1', [["S000", "SUM"]], "w_geocode") #using result object from ExportTable as input table here
-arcpy.management.AddField('statTable1','w_geo_txt', 'TEXT') #w_geocode is a double and it needs to be text to join properly with census blocks, add field and calculate, use str(int(double)) to get text without "xxx.0"
-arcpy.management.CalculateField('statTable1','w_geo_txt','str(int(!w_geocode!))') #because both add field and calculte field edit a table rather than generating a new table, don't need to use result object or export fields
-
-#Sum and group by HOME geocode to get home locations from dbf2, which is resident workers leaving the SA for work.
-AddMsgAndPrint("Creating Sum and Group by Table2",0)
-arcpy.analysis.Statistics(outdbf2,'statTable2',[["S000",'SUM']], "h_geocode") #group by h_geocode to get worker count per home geocode, i.e. the number of people leaving SA for work by census block
-arcpy.management.AddField('statTable2','h_geo_txt', 'TEXT')
-arcpy.management.CalculateField('statTable2','h_geo_txt','str(int(!h_geocode!))')
-
-#Sum and group by HOME geocode to get home locations from dbf3, which is resident workers staying in the SA for work.
-AddMsgAndPrint("Creating Sum and Group by Table3",0)
-arcpy.analysis.Statistics(outdbf3,'statTable3',[["S000",'SUM']], "h_geocode")#group by h_geocode to get worker count per home geocode, i.e. the number of people staying in SA for work by census block
-arcpy.management.AddField('statTable3','h_geo_txt', 'TEXT')
-arcpy.management.CalculateField('statTable3','h_geo_txt','str(int(!h_geocode!))')
-
-#Sum and group by HOME geocode to get home locations from dbf4, which is non-resident workers.
-AddMsgAndPrint("Creating Sum and Group by Table4",0)
-arcpy.analysis.Statistics(outdbf4,'statTable4',[["S000",'SUM']], "h_geocode")#group by h_geocode to get worker count per home geocode for the people coming into the city for work.
-arcpy.management.AddField('statTable4','h_geo_txt', 'TEXT')
-arcpy.management.CalculateField('statTable4','h_geo_txt','str(int(!h_geocode!))')
-
-#Sum and group by WORK geocode to get work locations from dbf4, which is non-resident workers.
-AddMsgAndPrint("Creating Sum and Group by Table5",0)
-arcpy.analysis.Statistics(outdbf4,'statTable5',[["S000",'SUM']], "w_geocode")#group by w_geocode to get worker count per work geocode for the people coming into the city for work.
-arcpy.management.AddField('statTable5','w_geo_txt', 'TEXT')
-arcpy.management.CalculateField('statTable5','w_geo_txt','str(int(!w_geocode!))')
-
-#---------------------------------------------------------------------------------------------------
-# 7 JOIN SUM AND GROUP BY TABLES TO CENSUS BLOCKS, EXTRACT WHERE MATCHING
-
-#join stat table 1 to census blocks intersecting study area = work locations for live in SA and work in SA
-AddMsgAndPrint("Creating residentWorkLocationsInsideStudyArea shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION') #first clear the selection
-arcpy.management.SelectLayerByLocation(cenBlocks, 'INTERSECT', inArea1,"",'NEW_SELECTION') #next select cenBlocks INSIDE study area, can be replaced with select by attribute with qry, cenblocls in blockList
-resWorkLoc_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable1','w_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS')
-arcpy.management.CopyFeatures(resWorkLoc_join, "residentWorkLocationsInSA")
-arcpy.management.RemoveJoin(cenBlocks) #remove the join
-
-#join stat table 1 to census blocks NOT intersecting study area = work locations for live in SA, work outside SA
-AddMsgAndPrint("Creating residentWorkLocationsOutsideStudyArea shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION') #first clear the selection
-arcpy.management.SelectLayerByLocation(cenBlocks, 'INTERSECT', inArea1,"",'NEW_SELECTION','INVERT') #next select cenBlocks OUTSIDE study area, can be replaced with select by attribute with qry, cenblocls in blockList
-resWorkLoc_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable1','w_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS') #redo the join with the inverted selection
-arcpy.management.CopyFeatures(resWorkLoc_join, "residentWorkLocationsOutsideSA")
-arcpy.management.RemoveJoin(cenBlocks)
-
-#join stat table 2 to census blocks=HOME locations for live in SA work outside SA
-AddMsgAndPrint("Creating HomeLocationsResidentsWorkOutsideStudyArea shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION') #first clear the selection on cenBlocks
-qry=buildWhereClauseFromList(cenBlocks,'GEOID',blockList) #build a query for the select by attribute
-arcpy.management.SelectLayerByAttribute(cenBlocks,'NEW_SELECTION',qry) #select census blocks by list of cenblocks intersecting SA before join to save time, select by attribute is faster than joining to 8 million census blocks
-resHomeLocWorkOutside_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable2','h_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS') #use the KEEP COMMON parameter to 'filter' the join
-arcpy.management.CopyFeatures(resHomeLocWorkOutside_join, "residentHomeLocWorkOutsideSA")
-arcpy.management.RemoveJoin(cenBlocks)
-
-#join stat table 3 to census blocks=HOME locations for live in SA work inside SA
-AddMsgAndPrint("Creating HomeLocationsResidentsWorkInsideStudyArea shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION')
-qry=buildWhereClauseFromList(cenBlocks,'GEOID',blockList)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'NEW_SELECTION',qry)
-resHomeLocWorkInside_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable3','h_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS') #use the KEEP COMMON parameter to 'filter' the join
-arcpy.management.CopyFeatures(resHomeLocWorkInside_join, "residentHomeLocWorkInsideSA")
-arcpy.management.RemoveJoin(cenBlocks)
-
-#join stat table 4 to census blocks=HOME locations for non-resident workers
-AddMsgAndPrint("Creating nonResidentHomeLocations shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION')
-#qry=buildWhereClauseFromList(cenBlocks,'GEOID',blockList) #home locations for non-residents will be outside SA, cant select by attribute to speed the join
-#arcpy.management.SelectLayerByAttribute(cenBlocks,'NEW_SELECTION',qry)
-nonResHomeLoc_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable4','h_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS') #use the KEEP COMMON parameter to 'filter' the join
-arcpy.management.CopyFeatures(nonResHomeLoc_join, "nonResidentHomeLocations")
-arcpy.management.RemoveJoin(cenBlocks)
-
-#join stat table 5 to census blocks=WORK locations for non-resident workers
-AddMsgAndPrint("Creating nonResidentWorkLocations  shapefile - this is a long process",0)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION')
-qry=buildWhereClauseFromList(cenBlocks,'GEOID',blockList)
-arcpy.management.SelectLayerByAttribute(cenBlocks,'NEW_SELECTION',qry)
-nonResWorkLoc_join=arcpy.management.AddJoin(cenBlocks,'GEOID','statTable5','w_geo_txt','KEEP_COMMON','INDEX_JOIN_FIELDS') #use the KEEP COMMON parameter to 'filter' the join
-arcpy.management.CopyFeatures(nonResWorkLoc_join, "nonResidentWorkLocations")
-arcpy.management.RemoveJoin(cenBlocks)
-
-AddMsgAndPrint("Done Creating workLocationsNonResidents shapefile - this is a long process",0)
-
-
-#---------------------------------------------------------------------------------------------------
-# 8 ADD DATA AND SYMBOLIZE
-
-m.addDataFromPath(os.path.join(defaultGDB,"residentWorkLocationsInSA"))
-m.addDataFromPath(os.path.join(defaultGDB,"residentWorkLocationsOutsideSA"))
-m.addDataFromPath(os.path.join(defaultGDB,"residentHomeLocWorkInsideSA"))
-m.addDataFromPath(os.path.join(defaultGDB,"residentHomeLocWorkOutsideSA"))
-m.addDataFromPath(os.path.join(defaultGDB,"nonResidentHomeLocations"))
-m.addDataFromPath(os.path.join(defaultGDB,"nonResidentWorkLocations"))
-
-
-l = m.listLayers("nonResidentWorkLocations")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-  if sym.renderer.type == "GraduatedSymbolsRenderer":
-    #set background symbol
-    sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-    #set symbol template - taken straight from documentation but does not work
-    # symTemp = sym.renderer.symbolTemplate
-    # symTemp.applySymbolFromGallery('Square 1')
-    # sym.renderer.updateSymbolTemplate(symTemp)
-    #modify graduated symbol renderer
-    sym.renderer.classificationField = "statTable5_SUM_S000"
-    sym.classificationMethod = "NaturalBreaks"
-    sym.renderer.breakCount = 5
-    sym.renderer.minimumSymbolSize = 4
-    sym.renderer.maximumSymbolSize = 18
-    #sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
-    l.symbology = sym
-
-l = m.listLayers("nonResidentHomeLocations")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-  if sym.renderer.type == "GraduatedSymbolsRenderer":
-    #set background symbol
-    sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-    #set symbol template - taken straight from documentation but does not work
-    # symTemp = sym.renderer.symbolTemplate
-    # symTemp.applySymbolFromGallery('Square 1')
-    # sym.renderer.updateSymbolTemplate(symTemp)
-    #modify graduated symbol renderer
-    sym.renderer.classificationField = "statTable4_SUM_S000"
-    sym.classificationMethod = "NaturalBreaks"
-    sym.renderer.breakCount = 5
-    sym.renderer.minimumSymbolSize = 4
-    sym.renderer.maximumSymbolSize = 18
-    #sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
-    l.symbology = sym
-
-l = m.listLayers("residentHomeLocWorkOutsideSA")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-    if sym.renderer.type == "GraduatedSymbolsRenderer":
-        # set background symbol
-        sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-        # set symbol template - taken straight from documentation but does not work
-        # symTemp = sym.renderer.symbolTemplate
-        # symTemp.applySymbolFromGallery('Square 1')
-        # sym.renderer.updateSymbolTemplate(symTemp)
-        # modify graduated symbol renderer
-        sym.renderer.classificationField = "statTable2_SUM_S000"
-        sym.classificationMethod = "NaturalBreaks"
-        sym.renderer.breakCount = 5
-        sym.renderer.minimumSymbolSize = 4
-        sym.renderer.maximumSymbolSize = 18
-        # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
-        l.symbology = sym
-
-l = m.listLayers("residentHomeLocWorkInsideSA")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-    if sym.renderer.type == "GraduatedSymbolsRenderer":
-        # set background symbol
-        sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-        # set symbol template - taken straight from documentation but does not work
-        # symTemp = sym.renderer.symbolTemplate
-        # symTemp.applySymbolFromGallery('Square 1')
-        # sym.renderer.updateSymbolTemplate(symTemp)
-        # modify graduated symbol renderer
-        sym.renderer.classificationField = "statTable3_SUM_S000"
-        sym.classificationMethod = "NaturalBreaks"
-        sym.renderer.breakCount = 5
-        sym.renderer.minimumSymbolSize = 4
-        sym.renderer.maximumSymbolSize = 18
-        # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
-        l.symbology = sym
-
-l = m.listLayers("residentWorkLocationsOutsideSA")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-    if sym.renderer.type == "GraduatedSymbolsRenderer":
-        # set background symbol
+def main():
+    # INITIAL SETUP
+    aprx = arcpy.mp.ArcGISProject("CURRENT") #Set project to the currently open project where the tool is being run
+    m = aprx.activeMap #Set map object to variable with activeMap method
+    arcpy.env.overwriteOutput=True
+
+    #TEMP OUTPUTS
+    tempout=arcpy.env.scratchGDB
+
+    #PERMANENT OUTPUTS
+    defaultGDB=aprx.defaultGeodatabase
+
+    #1 INPUT PARAMETERS
+    inArea1=arcpy.GetParameterAsText(0) #required study area
+    lodes=arcpy.GetParameterAsText(1) #requred lodes csv.gz data
+    #optional job segments parameter (index 2) is read in step 2, e.g. S000;SE01;SE02;SE03, defaults to S000
+    #optional cache folder (index 3) and cache size cap in GB (index 4) are read in step 5, parsed LODES files are kept there between runs
+    #optional local census block store folder (index 5) is read in step 3, see LODES_Blocks.py, if empty blocks come from the Living Atlas
+    #optional number of outputs to write at once (index 6) is read in step 7, 0 or empty writes all six at once, one worker
+    #process each, 1 writes them one after another in this process
+    #optional run report json (index 7) and cProfile dump (index 8) are read below, the report defaults to LODES_Reports in the project folder
+    #optional flow matrix level (index 9: blockGroup, tract, county, state or place), block assignment file for place (index 10),
+    #number of top areas (index 11) and work side level (index 13, e.g. tract homes to county workplaces, defaults to the index 9
+    #level) are read in steps 2 and 7B, no flow matrix tables are written if the level is empty
+    #optional incremental state folder (index 12) is read in step 5, when set each run is saved there and a rerun against the same
+    #LODES file, job columns and geodatabase only redoes the blocks that moved in or out of the study area, see LODES_Incremental.py
+
+
+
+    ##---------------------------------------------------------------------------------------------------
+    # RUN REPORT
+    #Each step below is timed between beginStage and endStage (wall and CPU time, memory, rows in and out),
+    #the report is written to json at the end of step 8 so runs can be compared across releases
+    reportPath = getOptionalParameter(7, os.path.join(aprx.homeFolder, 'LODES_Reports', time.strftime('LODES_Run_%Y%m%d_%H%M%S.json')))
+    profilePath = getOptionalParameter(8) #cProfile stats file, only profiled if set
+    run = LODES_Profile.startRun(reportPath, profilePath, AddMsgAndPrint, lambda label: arcpy.SetProgressor("", label),
+                                 studyArea=inArea1, lodes=lodes)
+
+
+
+    ##---------------------------------------------------------------------------------------------------
+    ## 2 USER INPUT STUDY AREA
+    LODES_Profile.beginStage(run, "2 Checking study area")
+
+    #check input for type polygon-stolen from arcpy documentation
+    inArea1Desc=arcpy.Describe(inArea1)
+    if inArea1Desc.shapeType != "Polygon" :
+        AddMsgAndPrint("Input Study Area must be of type polygon.", 2)
+        sys.exit()
+
+    #check the LODES file is an OD file, RAC and WAC files have no flows to map (see LODES_Core.summarizeArea)
+    if LODES_Core.lodesLayout(lodes) != 'od':
+        AddMsgAndPrint("LODES file must be an origin-destination (od) file.", 2)
+        sys.exit()
+
+    #job segments to sum, S000 is always included because the symbology below is built on it
+    try:
+        jobCols = getJobCols(2)
+    except ValueError as e:
+        AddMsgAndPrint(str(e), 2)
+        sys.exit()
+
+    #check the flow matrix levels before any work is done, place also needs a block assignment file
+    flowLevel = getOptionalParameter(9)
+    workLevel = getOptionalParameter(13, flowLevel)
+    for level in (flowLevel, workLevel):
+        if level and level not in LODES_Flows.LEVELS:
+            AddMsgAndPrint("Flow level must be one of %s." % ', '.join(LODES_Flows.LEVELS), 2)
+            sys.exit()
+    if workLevel and not flowLevel:
+        AddMsgAndPrint("A work side flow level needs a flow level for the home side.", 2)
+        sys.exit()
+    if 'place' in (flowLevel, workLevel) and not getOptionalParameter(10):
+        AddMsgAndPrint("Place level flows need a block assignment file.", 2)
+        sys.exit()
+
+
+    ##---------------------------------------------------------------------------------------------------
+    ## 3 ADD CENSUS DATA TO MAP
+    LODES_Profile.endStage(run)
+    LODES_Profile.beginStage(run, "3 Adding census blocks")
+
+    # use the local block store if there is one (built once from TIGER files with LODES_Blocks.py), no network round trip
+    arcpy.SetProgressor("","Adding census blocks")
+    blockStore = getOptionalParameter(5)
+    if blockStore:
+        cenBlocks = arcpy.management.MakeFeatureLayer(LODES_Blocks.storeFeatureClass(blockStore), 'cenBlocks')[0]
+    else:
+        # otherwise add the living atlas layer from path, with method on map object
+        # Note, the layer imports as a group layer, and the sublayer needed is called 'Blocks', which is
+        # generic and it seems inconsistent, somtimes called 'USA_BLOCK_GROUPS//Blocks, therefore, will
+        # get the layer from the group by looking for 15 digit block GEOIDs rather than counting features in every layer
+        try:
+            cenBlocks = LODES_Blocks.findBlockLayer(m.addDataFromPath(dataPath))
+        except ValueError as e:
+            AddMsgAndPrint(str(e), 2)
+            sys.exit()
+
+
+    AddMsgAndPrint("Finished adding census blocks", 0)
+
+    arcpy.AddMessage(arcpy.management.GetCount(cenBlocks))
+    #arcpy.management.CopyFeatures(cenBlocksOnline,"cenBlocks")
+
+
+
+    ##---------------------------------------------------------------------------------------------------
+    ## 4 EXTRACT LIST OF HOME CENSUS BLOCKS IN STUDY AREA
+    LODES_Profile.endStage(run)
+    LODES_Profile.beginStage(run, "4 Selecting census blocks in study area")
+
+    #The inside set (GEOIDs of blocks intersecting the study area) is found once here and reused by every later step,
+    #step 7 splits inside/outside by these GEOIDs instead of running the location selection again
+    arcpy.SetProgressor("","Selecting by location")
+    AddMsgAndPrint("Selecting by by location", 0)
+    if blockStore:
+        #R-tree over the block extents narrows the candidates, then only those blocks are tested exactly
+        insideBlocks = LODES_Blocks.blocksIntersecting(blockStore, LODES_Blocks.studyAreaPolygon(inArea1))
+        blockList = insideBlocks['geoid'].tolist()
+    else:
+        arcpy.management.SelectLayerByLocation(cenBlocks, 'INTERSECT', inArea1,"",'NEW_SELECTION')
+        arcpy.AddMessage(arcpy.management.GetCount(cenBlocks))
+
+        arcpy.SetProgressor("","Creating census block list")
+        AddMsgAndPrint("Creating census block list", 0)
+        blockList = []
+        with arcpy.da.SearchCursor(cenBlocks, 'GEOID') as cur1:
+            for row in cur1:
+                blockList.append((int(cur1[0]))) #For some reason, GEOID returns a tuple with an empty second, need to use index 0 to get the id
+
+
+    AddMsgAndPrint(len(blockList))
+    LODES_Profile.endStage(run, len(blockList))
+
+
+
+
+
+    ##---------------------------------------------------------------------------------------------------
+    ## 5 EXTRACT DATA FROM LODES.CSV, FILTER BY STUDY AREA LIST
+    LODES_Profile.beginStage(run, "5 Extracting LODES data") #rows in is the LODES row count, known once the cache is open
+
+    #Read LODES through the cache, the first run against a file parses the csv.gz once into memory mapped columns,
+    #later runs (e.g. a new study area against the same state file) skip the decompress and only read matching rows
+    AddMsgAndPrint("Extracting LODES csv",0)
+    cacheDir = getOptionalParameter(3, os.path.join(aprx.homeFolder, 'LODES_Cache'))
+    cacheBytes = int(float(getOptionalParameter(4, LODES_Cache.MAXCACHEBYTES / 1024 ** 3)) * 1024 ** 3)
+    stateFolder = getOptionalParameter(12)
+    update = None
+    columns, index, layout = LODES_Cache.openCache(lodes, cacheDir, cacheBytes)
+    if stateFolder:
+        #incremental mode, start from the previous run if it used the same LODES file, job columns and geodatabase
+        #and its outputs are just as it left them, otherwise do a full run and save it for next time
+        lodesKey = LODES_Cache.cacheKey(lodes, cacheDir)
+        fingerprint = LODES_Blocks.outputFingerprint(defaultGDB, LODES_Core.OUTPUTLAYERS)
+        state = LODES_Incremental.loadState(stateFolder, lodesKey, jobCols, defaultGDB, fingerprint)
+        if state is not None:
+            update = LODES_Incremental.updateRun(columns, index, state, blockList, jobCols)
+        if update is None:
+            AddMsgAndPrint("No previous run to update, running the whole study area",0)
+            rows = LODES_Core.indexedRows(columns, index, blockList)
+            od = LODES_Core.takeRows(columns, rows, layout, jobCols)
+        else:
+            AddMsgAndPrint("Updating the previous run, %d census blocks added and %d removed"
+                           % (len(update['added']), len(update['removed'])),0)
+            rows = update['rows']
+            od = update['od']
+    else:
+        od = LODES_Core.filterIndexed(columns, index, blockList, layout, jobCols)
+    arcpy.AddMessage(od.shape)
+    LODES_Profile.endStage(run, len(od), len(columns['h_geocode']))
+    LODES_Profile.beginStage(run, "6 Classifying and summing flows", len(od))
+
+    #Classify every row once against the study area list, home and work membership are only tested one time
+    #df = home in SA, df2 = home in SA work outside, df3 = home in SA work inside, df4 = work in SA home outside
+    #an incremental run has already summed again only the stat table rows keyed on blocks touched by the change
+    if update is None:
+        parts, statTables = LODES_Core.classifyOD(od, blockList, jobCols)
+    else:
+        parts, statTables = update['parts'], update['statTables']
+    df = parts['liveIn']
+    df2 = parts['liveInWorkOut']
+    df3 = parts['liveInWorkIn']
+    df4 = parts['liveOutWorkIn']
+    arcpy.AddMessage(df.shape)
+    arcpy.AddMessage(df2.shape)
+    arcpy.AddMessage(df3.shape)
+    arcpy.AddMessage(df4.shape)
+
+
+
+    ##---------------------------------------------------------------------------------------------------
+    ## 6 SUM JOB SEGMENTS AND GROUP BY TO GET PEOPLE WORKING AND LIVING IN EACH RELATED CENSUS BLOCK
+    #The sums are already built in memory by classifyOD (see LODES_Core.FLOWSUMS), this just writes them out.
+    #Each table has the text GEOID key (w_geo_txt or h_geo_txt, zero padded to 15 characters), FREQUENCY and a SUM_ field per job segment
+    #statTable1 = WORK locations of residents, will split by inside/outside SA in join below
+    #statTable2 = HOME locations of residents leaving the SA for work
+    #statTable3 = HOME locations of residents staying in the SA for work
+    #statTable4 = HOME locations of non-residents coming into the SA for work
+    #statTable5 = WORK locations of non-residents coming into the SA for work
+    for name, table in statTables.items():
+        if update is not None and len(update['changedKeys'][name]) == 0:
+            continue #nothing changed in this table since the last run
+        AddMsgAndPrint("Creating Sum and Group by " + name,0)
+        outTable = os.path.join(defaultGDB, name)
+        if arcpy.Exists(outTable): #NumPyArrayToTable will not overwrite an existing table
+            arcpy.management.Delete(outTable)
+        arcpy.da.NumPyArrayToTable(LODES_Core.statTableToArray(table), outTable)
+    LODES_Profile.endStage(run, sum(len(table) for table in statTables.values()))
+
+    #---------------------------------------------------------------------------------------------------
+    # 7 JOIN SUM AND GROUP BY TABLES TO CENSUS BLOCKS, EXTRACT WHERE MATCHING
+    #Each stat table is matched to census blocks by GEOID lookup in a sorted GEOID/ObjectID table built once,
+    #then only the matched blocks are copied out with the stat table fields and their own block fields, no selections, IN(...) queries or AddJoin
+    #on the whole block layer. See LODES_Core.OUTPUTLAYERS for which stat table goes to which output.
+    LODES_Profile.beginStage(run, "7 Creating output feature classes", sum(len(table) for table in statTables.values()))
+    AddMsgAndPrint("Creating census block GEOID index",0)
+    if blockStore:
+        blockSource = LODES_Blocks.storeFeatureClass(blockStore)
+        blockTable = LODES_Blocks.storeBlockTable(blockStore)
+    else:
+        arcpy.management.SelectLayerByAttribute(cenBlocks,'CLEAR_SELECTION') #cursors only see selected features
+        blockSource = cenBlocks
+        blockTable = LODES_Blocks.layerBlockTable(cenBlocks, cacheDir) #read over the FeatureServer once, then kept in the cache folder
+
+    #The six outputs are independent, with more than one output worker each one is written by its own process
+    #(which opens the blocks by path) and reported as soon as it is done
+    outputs = {}
+    for outName, (tableName, side) in LODES_Core.OUTPUTLAYERS.items():
+        outputs[outName] = (tableName, LODES_Core.outputTable(statTables, outName, blockList))
+
+    AddMsgAndPrint("Creating output feature classes",0)
+    outputWorkers = int(getOptionalParameter(6, 0)) or None #0 or empty starts one worker process per output, 1 writes them in this process
+    if outputWorkers != 1:
+        useEnvironmentPython() #worker processes start pythonw.exe, not another ArcGISPro.exe
+    totalWritten = 0
+    if update is None:
+        for outName, written in LODES_Blocks.writeJoinedOutputs(blockSource, blockTable, outputs, defaultGDB, outputWorkers):
+            AddMsgAndPrint("Finished %s, %d census blocks" % (outName, written),0)
+            totalWritten += written
+    else:
+        #incremental run, only the features of changed stat table keys are deleted and written again
+        changes = LODES_Incremental.outputChanges(statTables, update['changedKeys'], blockList)
+        for outName, deleted, written in LODES_Blocks.updateJoinedOutputs(blockSource, blockTable, changes, defaultGDB, outputWorkers):
+            AddMsgAndPrint("Updated %s, %d census blocks removed, %d written" % (outName, deleted, written),0)
+            totalWritten += written
+
+    AddMsgAndPrint("Done Creating output feature classes",0)
+    LODES_Profile.endStage(run, totalWritten)
+    if stateFolder:
+        fingerprint = LODES_Blocks.outputFingerprint(defaultGDB, LODES_Core.OUTPUTLAYERS)
+        LODES_Incremental.saveState(stateFolder, lodesKey, jobCols, defaultGDB, blockList, rows, statTables, fingerprint)
+
+
+    #---------------------------------------------------------------------------------------------------
+    # 7B OD FLOW MATRIX BY GEOGRAPHIC LEVEL
+    #Sums the study area's outflow (residents to work areas) and inflow (home areas to workers) into sparse area x area
+    #matrices at the chosen home and work levels, then writes the matrix, the top destinations/origins and the distance bands
+    #(OnTheMap's Destination and Distance/Direction reports). See LODES_Flows.py. Distances need block centroids, so the block store.
+    if flowLevel: #checked in step 2
+        levelName = flowLevel if workLevel == flowLevel else flowLevel + '_' + workLevel #e.g. outflow_tract_county
+        LODES_Profile.beginStage(run, "7B Summing flows by " + levelName, len(od))
+        crosswalk = LODES_Flows.readBlockAssignment(getOptionalParameter(10)) if 'place' in (flowLevel, workLevel) else None
+        topN = int(getOptionalParameter(11, 10))
+        flows = LODES_Flows.studyAreaFlows(parts, flowLevel, jobCols, crosswalk, workLevel)
+        if blockStore:
+            spatialReference = arcpy.Describe(blockSource).spatialReference
+            centroids = LODES_Blocks.geographicCentroids(LODES_Flows.areaCentroids(blockTable, flowLevel, crosswalk), spatialReference)
+            workCentroids = None
+            if workLevel != flowLevel:
+                workCentroids = LODES_Blocks.geographicCentroids(LODES_Flows.areaCentroids(blockTable, workLevel, crosswalk), spatialReference)
+        else:
+            centroids = None
+            AddMsgAndPrint("Distance bands need a census block store, skipping them",1)
+
+        flowTables = {}
+        for direction, matrix in flows.items():
+            flowTables[direction + '_' + levelName] = LODES_Flows.matrixTable(matrix)
+            top = LODES_Flows.topAreas(matrix, topN, 'w_area' if direction == 'outflow' else 'h_area')
+            flowTables[direction + 'Top_' + levelName] = top
+            if centroids is not None:
+                flowTables[direction + 'Distance_' + levelName] = LODES_Flows.distanceBands(matrix, centroids, workCentroids=workCentroids)
+        for name, table in flowTables.items():
+            AddMsgAndPrint("Creating " + name,0)
+            outTable = os.path.join(defaultGDB, name)
+            if arcpy.Exists(outTable):
+                arcpy.management.Delete(outTable)
+            arcpy.da.NumPyArrayToTable(LODES_Flows.flowTableToArray(table), outTable)
+        LODES_Profile.endStage(run, sum(len(table) for table in flowTables.values()))
+
+
+    #---------------------------------------------------------------------------------------------------
+    # 8 ADD DATA AND SYMBOLIZE
+    LODES_Profile.beginStage(run, "8 Adding outputs to map")
+
+    m.addDataFromPath(os.path.join(defaultGDB,"residentWorkLocationsInSA"))
+    m.addDataFromPath(os.path.join(defaultGDB,"residentWorkLocationsOutsideSA"))
+    m.addDataFromPath(os.path.join(defaultGDB,"residentHomeLocWorkInsideSA"))
+    m.addDataFromPath(os.path.join(defaultGDB,"residentHomeLocWorkOutsideSA"))
+    m.addDataFromPath(os.path.join(defaultGDB,"nonResidentHomeLocations"))
+    m.addDataFromPath(os.path.join(defaultGDB,"nonResidentWorkLocations"))
+
+
+    l = m.listLayers("nonResidentWorkLocations")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+      if sym.renderer.type == "GraduatedSymbolsRenderer":
+        #set background symbol
         sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-        # set symbol template - taken straight from documentation but does not work
+        #set symbol template - taken straight from documentation but does not work
         # symTemp = sym.renderer.symbolTemplate
         # symTemp.applySymbolFromGallery('Square 1')
         # sym.renderer.updateSymbolTemplate(symTemp)
-        # modify graduated symbol renderer
-        sym.renderer.classificationField = "statTable1_SUM_S000"
+        #modify graduated symbol renderer
+        sym.renderer.classificationField = "statTable5_SUM_S000"
         sym.classificationMethod = "NaturalBreaks"
         sym.renderer.breakCount = 5
         sym.renderer.minimumSymbolSize = 4
         sym.renderer.maximumSymbolSize = 18
-        # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+        #sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
         l.symbology = sym
 
-l = m.listLayers("residentWorkLocationsInSA")[0]
-sym = l.symbology
-sym.updateRenderer('GraduatedSymbolsRenderer')
-if hasattr(sym, 'renderer'):
-    if sym.renderer.type == "GraduatedSymbolsRenderer":
-        # set background symbol
+    l = m.listLayers("nonResidentHomeLocations")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+      if sym.renderer.type == "GraduatedSymbolsRenderer":
+        #set background symbol
         sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
-        # set symbol template - taken straight from documentation but does not work
+        #set symbol template - taken straight from documentation but does not work
         # symTemp = sym.renderer.symbolTemplate
         # symTemp.applySymbolFromGallery('Square 1')
         # sym.renderer.updateSymbolTemplate(symTemp)
-        # modify graduated symbol renderer
-        sym.renderer.classificationField = "statTable1_SUM_S000"
+        #modify graduated symbol renderer
+        sym.renderer.classificationField = "statTable4_SUM_S000"
         sym.classificationMethod = "NaturalBreaks"
         sym.renderer.breakCount = 5
         sym.renderer.minimumSymbolSize = 4
         sym.renderer.maximumSymbolSize = 18
-        # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+        #sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
         l.symbology = sym
 
-arcpy.AddMessage('end')
-
-
+    l = m.listLayers("residentHomeLocWorkOutsideSA")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+        if sym.renderer.type == "GraduatedSymbolsRenderer":
+            # set background symbol
+            sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
+            # set symbol template - taken straight from documentation but does not work
+            # symTemp = sym.renderer.symbolTemplate
+            # symTemp.applySymbolFromGallery('Square 1')
+            # sym.renderer.updateSymbolTemplate(symTemp)
+            # modify graduated symbol renderer
+            sym.renderer.classificationField = "statTable2_SUM_S000"
+            sym.classificationMethod = "NaturalBreaks"
+            sym.renderer.breakCount = 5
+            sym.renderer.minimumSymbolSize = 4
+            sym.renderer.maximumSymbolSize = 18
+            # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+            l.symbology = sym
+
+    l = m.listLayers("residentHomeLocWorkInsideSA")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+        if sym.renderer.type == "GraduatedSymbolsRenderer":
+            # set background symbol
+            sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
+            # set symbol template - taken straight from documentation but does not work
+            # symTemp = sym.renderer.symbolTemplate
+            # symTemp.applySymbolFromGallery('Square 1')
+            # sym.renderer.updateSymbolTemplate(symTemp)
+            # modify graduated symbol renderer
+            sym.renderer.classificationField = "statTable3_SUM_S000"
+            sym.classificationMethod = "NaturalBreaks"
+            sym.renderer.breakCount = 5
+            sym.renderer.minimumSymbolSize = 4
+            sym.renderer.maximumSymbolSize = 18
+            # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+            l.symbology = sym
+
+    l = m.listLayers("residentWorkLocationsOutsideSA")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+        if sym.renderer.type == "GraduatedSymbolsRenderer":
+            # set background symbol
+            sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
+            # set symbol template - taken straight from documentation but does not work
+            # symTemp = sym.renderer.symbolTemplate
+            # symTemp.applySymbolFromGallery('Square 1')
+            # sym.renderer.updateSymbolTemplate(symTemp)
+            # modify graduated symbol renderer
+            sym.renderer.classificationField = "statTable1_SUM_S000"
+            sym.classificationMethod = "NaturalBreaks"
+            sym.renderer.breakCount = 5
+            sym.renderer.minimumSymbolSize = 4
+            sym.renderer.maximumSymbolSize = 18
+            # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+            l.symbology = sym
+
+    l = m.listLayers("residentWorkLocationsInSA")[0]
+    sym = l.symbology
+    sym.updateRenderer('GraduatedSymbolsRenderer')
+    if hasattr(sym, 'renderer'):
+        if sym.renderer.type == "GraduatedSymbolsRenderer":
+            # set background symbol
+            sym.renderer.backgroundSymbol.applySymbolFromGallery("Extent Gray Hollow")
+            # set symbol template - taken straight from documentation but does not work
+            # symTemp = sym.renderer.symbolTemplate
+            # symTemp.applySymbolFromGallery('Square 1')
+            # sym.renderer.updateSymbolTemplate(symTemp)
+            # modify graduated symbol renderer
+            sym.renderer.classificationField = "statTable1_SUM_S000"
+            sym.classificationMethod = "NaturalBreaks"
+            sym.renderer.breakCount = 5
+            sym.renderer.minimumSymbolSize = 4
+            sym.renderer.maximumSymbolSize = 18
+            # sym.renderer.colorRamp = aprx.listColorRamps("Black to White")[0]
+            l.symbology = sym
+
+    LODES_Profile.finishRun(run)
+    if reportPath:
+        AddMsgAndPrint("Run report written to " + reportPath,0)
+    arcpy.AddMessage('end')
+
+
+#output worker processes import this file too, only run the tool in the main process
+if __name__ == '__main__':
+    main()
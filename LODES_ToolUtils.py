@@ -0,0 +1,66 @@
+###############################################
+# Title: LODES Tool Utilities
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Messaging and parameter helpers shared by the LODES script tools (LODES_Script_Tool.py,
+# LODES_Batch_Tool.py, LODES_Trend_Tool.py), so each tool reports errors and reads optional parameters the same way.
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import arcpy
+import multiprocessing
+import sys
+import os
+import LODES_Core
+
+
+
+##---------------------------------------------------------------------------------------------------
+# FUNCTIONS
+# CREATE FUNCTION TO ADD MESSAGES THROUGHOUT SCRIPT, taken from arcpy documentation
+def AddMsgAndPrint(msg, severity=0):
+    # Adds a Message (in case this is run as a tool)
+    # and also prints the message to the screen (standard output)
+    print(msg)
+
+    # Split the message on \n first, so that if its multiple lines,
+    # a GPMessage will be added for each line
+    try:
+        for string in msg.split('\n'):
+            # Add appropriate geoprocessing message
+            if severity == 0:
+                arcpy.AddMessage(string)
+            elif severity == 1:
+                arcpy.AddWarning(string)
+            elif severity == 2:
+                arcpy.AddError(string)
+    except:
+        pass
+
+#CREATE FUNCTION TO READ AN OPTIONAL TOOL PARAMETER
+def getOptionalParameter(index, default=None):
+    """Returns the text of tool parameter index, or default if it is empty or the
+    toolbox does not define it."""
+    try:
+        value = arcpy.GetParameterAsText(index)
+    except Exception:
+        value = ''
+    return value if value else default
+
+#CREATE FUNCTION TO READ THE JOB SEGMENTS PARAMETER
+def getJobCols(index):
+    """Reads a job segments parameter (e.g. S000;SE01;SE02;SE03) and returns the OD job
+    columns to sum, S000 first because the symbology is built on it. Raises ValueError
+    naming any segment that is not an OD job column, so a typo is caught before any
+    worker process starts."""
+    jobCols = [col.strip("'") for col in getOptionalParameter(index, 'S000').split(';')]
+    return LODES_Core.selectJobCols('od', ['S000'] + [col for col in jobCols if col != 'S000'])
+
+#CREATE FUNCTION TO LET WORKER PROCESSES START FROM A SCRIPT TOOL
+def useEnvironmentPython():
+    """Geoprocessing runs inside ArcGISPro.exe, so worker processes have to start the
+    environment's pythonw.exe instead of another copy of Pro."""
+    pythonw = os.path.join(sys.exec_prefix, 'pythonw.exe')
+    if os.path.exists(pythonw):
+        multiprocessing.set_executable(pythonw)
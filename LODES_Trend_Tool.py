@@ -0,0 +1,77 @@
+###############################################
+# Title: LODES Trend Analysis
+# Author: Chad Ramos  https://www.linkedin.com/in/chad-ramos
+# Description: Script tool that runs the LODES flow analysis for one study area against several LODES OD
+# files at once, e.g. 2015-2021 main and aux files, and writes one long table keyed by year, flow and
+# census block. The files are read and filtered in parallel (see LODES_Batch.runTrend).
+# Pseudocode:
+# 1 set input parameters
+# 2 Get user input study area and check for polygon
+# 3 Extract list of census blocks within study area by geoid
+# 4 Read, filter and sum every LODES file in parallel, write the long table
+
+
+
+###############################################
+# IMPORT LIBRARIES
+import arcpy
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) #LODES_*.py live next to this script
+import LODES_Batch
+from LODES_ToolUtils import AddMsgAndPrint, getOptionalParameter, getJobCols, useEnvironmentPython
+
+
+
+##---------------------------------------------------------------------------------------------------
+def main():
+    ## 1 INPUT PARAMETERS
+    aprx = arcpy.mp.ArcGISProject("CURRENT")
+    arcpy.env.overwriteOutput = True
+
+    inArea1 = arcpy.GetParameterAsText(0) #study area polygon
+    cenBlocks = arcpy.GetParameterAsText(1) #census blocks layer with a GEOID field
+    files = [f.strip("'") for f in arcpy.GetParameterAsText(2).split(';')] #LODES OD csv.gz files, any mix of years, states, main and aux
+    outCsv = arcpy.GetParameterAsText(3) #long format output table
+    try:
+        jobCols = getJobCols(4) #checked here, a typo would otherwise only fail inside a worker process
+    except ValueError as e:
+        AddMsgAndPrint(str(e), 2)
+        sys.exit()
+    cacheDir = getOptionalParameter(5, os.path.join(aprx.homeFolder, 'LODES_Cache'))
+    workers = int(getOptionalParameter(6, 0)) or None #0 or empty uses one worker per CPU
+
+    ## 2 USER INPUT STUDY AREA
+    if arcpy.Describe(inArea1).shapeType != "Polygon":
+        AddMsgAndPrint("Input Study Area must be of type polygon.", 2)
+        sys.exit()
+    try:
+        for lodes in files:
+            LODES_Batch.parseLodesName(lodes)
+    except ValueError as e:
+        AddMsgAndPrint(str(e), 2)
+        sys.exit()
+
+    ## 3 EXTRACT LIST OF CENSUS BLOCKS IN STUDY AREA
+    arcpy.SetProgressor("", "Creating census block list")
+    blocks = arcpy.management.MakeFeatureLayer(cenBlocks, 'trendBlocks')
+    arcpy.management.SelectLayerByLocation(blocks, 'INTERSECT', inArea1, "", 'NEW_SELECTION')
+    with arcpy.da.SearchCursor(blocks, 'GEOID') as cur1:
+        blockList = [row[0] for row in cur1]
+    arcpy.management.Delete(blocks)
+    AddMsgAndPrint("%d census blocks in study area" % len(blockList))
+
+    ## 4 READ, FILTER AND SUM EVERY LODES FILE
+    useEnvironmentPython()
+
+    arcpy.SetProgressor("", "Reading %d LODES files" % len(files))
+    trend = LODES_Batch.runTrend(files, blockList, jobCols, cacheDir, workers=workers)
+    trend.to_csv(outCsv, index=False)
+    AddMsgAndPrint("Wrote %d rows to %s" % (len(trend), outCsv))
+
+    arcpy.AddMessage('end')
+
+
+#worker processes import this file too, only run the tool in the main process
+if __name__ == '__main__':
+    main()